@@ -5,7 +5,7 @@
 {
     "name": "Document Management System",
     "summary": """Document Management System for Odoo""",
-    "version": "17.0.1.1.1",
+    "version": "17.0.1.6.0",
     "category": "Document Management",
     "license": "LGPL-3",
     "website": "https://github.com/OCA/dms",
@@ -28,6 +28,7 @@
         "template/portal.xml",
         # Data
         "data/onboarding_data.xml",
+        "data/ir_cron.xml",
         # Views
         "views/dms_tag.xml",
         "views/dms_category.xml",
@@ -75,4 +76,5 @@
     ],
     "icon": "/dms/static/description/icon.png",
     "application": True,
+    "uninstall_hook": "uninstall_hook",
 }
@@ -1,2 +1,3 @@
+from . import file
 from . import main
 from . import portal
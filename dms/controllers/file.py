@@ -0,0 +1,33 @@
+# Copyright 2024 Subteno - Timothée Vannier (https://www.subteno.com).
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl).
+import json
+
+from odoo import http
+from odoo.http import request
+
+
+class DmsFileController(http.Controller):
+    @http.route("/dms/file/upload", type="http", methods=["POST"], auth="user")
+    def dms_file_upload(self, directory_id, ufile=None, context=None, **kwargs):
+        """
+        Create files from a multipart upload.
+
+        The uploaded contents are read once from the request and handed to
+        ``dms.file``, without creating intermediate ``ir.attachment`` records.
+
+        :param str directory_id: The id of the directory of the new files.
+        :param ufile: The uploaded files.
+        :param str context: The JSON encoded context of the view, so that its
+            defaults apply to the new files.
+
+        :return: A JSON list with the id or the error of each file.
+        :rtype: odoo.http.Response
+        """
+        uploads = [
+            (ufile.filename, ufile.read())
+            for ufile in request.httprequest.files.getlist("ufile")
+        ]
+        directory = request.env["dms.directory"].browse(int(directory_id))
+        file_model = request.env["dms.file"].with_context(**json.loads(context or "{}"))
+        result = file_model._create_from_uploads(directory, uploads)
+        return request.make_json_response(result)
@@ -1,16 +1,18 @@
 # Copyright 2020-2021 Tecnativa - Víctor Martínez
 # Copyright 2024 Subteno - Timothée VANNIER (https://www.subteno.com).
 # License LGPL-3.0 or later (https://www.gnu.org/licenses/lgpl).
-import base64
 from typing import Optional  # noqa # pylint: disable=unused-import
 
 from odoo import _, http
-from odoo.http import content_disposition, request
+from odoo.http import request
 from odoo.osv.expression import OR
 
-from odoo.addons.portal.controllers.portal import CustomerPortal
+from odoo.addons.portal.controllers.portal import CustomerPortal, pager as portal_pager
 from odoo.addons.web.controllers.utils import ensure_db
 
+# Number of records kept in the session history of the listings
+HISTORY_LIMIT = 100
+
 
 class CustomerPortal(CustomerPortal):
     def _dms_check_access(self, model, res_id, access_token=None):
@@ -36,17 +38,22 @@ class CustomerPortal(CustomerPortal):
     def _prepare_home_portal_values(self, counters):
         values = super()._prepare_home_portal_values(counters)
         if "dms_directory_count" in counters:
-            ids = request.env["dms.directory"]._get_own_root_directories()
-            values["dms_directory_count"] = len(ids)
+            directory_model = request.env["dms.directory"]
+            values["dms_directory_count"] = directory_model._get_own_root_directories(
+                count=True
+            )
         return values
 
-    @http.route(["/my/dms"], type="http", auth="user", website=True)
+    @http.route(
+        ["/my/dms", "/my/dms/page/<int:page>"], type="http", auth="user", website=True
+    )
     def portal_my_dms(
-        self, sortby=None, filterby=None, search=None, search_in="name", **kw
+        self, page=1, sortby=None, filterby=None, search=None, search_in="name", **kw
     ):
         """
         Display the main page for the DMS module.
 
+        :param int page: The page to display
         :param Optional[str] sortby: The field to sort by
         :param Optional[str] filterby: The field to filter by
         :param Optional[str] search: The search term
@@ -64,19 +71,28 @@ class CustomerPortal(CustomerPortal):
             sortby,
         ) = self._searchbar_data(filterby, sortby)
         # domain
-        domain = [
-            ("id", "in", request.env["dms.directory"]._get_own_root_directories()),
-        ]
+        domain = request.env["dms.directory"]._get_own_root_directories_domain()
         # search
         if search and search_in == "name":
             domain += OR([[], [("name", "ilike", search)]])
         # content according to pager and archive selected
-        items = request.env["dms.directory"].search(domain, order=sort_order)
-        request.session["my_dms_folder_history"] = items.ids
+        directory_model = request.env["dms.directory"]
+        pager = portal_pager(
+            url="/my/dms",
+            url_args={"sortby": sortby, "search": search, "search_in": search_in},
+            total=directory_model.search_count(domain),
+            page=page,
+            step=self._items_per_page,
+        )
+        items = directory_model.search(
+            domain, order=sort_order, limit=self._items_per_page, offset=pager["offset"]
+        )
+        request.session["my_dms_folder_history"] = items.ids[:HISTORY_LIMIT]
         # values
         values.update(
             {
                 "dms_directories": items,
+                "pager": pager,
                 "page_name": "dms_directory",
                 "default_url": "/my/dms",
                 "searchbar_sortings": searchbar_sortings,
@@ -90,7 +106,10 @@ class CustomerPortal(CustomerPortal):
         return request.render("dms.portal_my_dms", values)
 
     @http.route(
-        ["/my/dms/directory/<int:dms_directory_id>"],
+        [
+            "/my/dms/directory/<int:dms_directory_id>",
+            "/my/dms/directory/<int:dms_directory_id>/page/<int:page>",
+        ],
         type="http",
         auth="public",
         website=True,
@@ -98,6 +117,7 @@ class CustomerPortal(CustomerPortal):
     def portal_my_dms_directory(
         self,
         dms_directory_id=False,
+        page=1,
         sortby=None,
         filterby=None,
         search=None,
@@ -109,6 +129,7 @@ class CustomerPortal(CustomerPortal):
         Display the content of a directory.
 
         :param Optional[int] dms_directory_id: dms_directory_id
+        :param int page: page
         :param Optional[str] sortby: sortby
         :param Optional[str] filterby: filterby
         :param Optional[str] search: search
@@ -127,16 +148,37 @@ class CustomerPortal(CustomerPortal):
             sort_order,
             sortby,
         ) = self._searchbar_data(filterby, sortby)
-        dms_directory_items, res = self._get_directories(
-            access_token, dms_directory_id, search, search_in, sort_order
-        )
+        res = self._dms_check_access("dms.directory", dms_directory_id, access_token)
         if not res:
             return request.redirect("/" if access_token else "/my")
 
         dms_directory_sudo = res
-        # dms_files_count
-        dms_file_items = self._get_files(
-            access_token, dms_directory_id, search, search_in, sort_order
+        # The access token was checked along with the directory
+        sudo = bool(access_token)
+        directory_count, file_count = self._get_directory_content_counts(
+            access_token, dms_directory_id, search, search_in, sudo=sudo
+        )
+        pager = portal_pager(
+            url="/my/dms/directory/%s" % dms_directory_id,
+            url_args={
+                "sortby": sortby,
+                "search": search,
+                "search_in": search_in,
+                "access_token": access_token,
+            },
+            total=directory_count + file_count,
+            page=page,
+            step=self._items_per_page,
+        )
+        dms_directory_items, dms_file_items = self._get_directory_content(
+            access_token,
+            dms_directory_id,
+            search,
+            search_in,
+            sort_order,
+            offset=pager["offset"],
+            sudo=sudo,
+            directory_count=directory_count,
         )
 
         dms_parent_categories = dms_directory_sudo.sudo()._get_parent_categories(
@@ -145,6 +187,7 @@ class CustomerPortal(CustomerPortal):
         # values
         values = {
             "dms_directories": dms_directory_items,
+            "pager": pager,
             "page_name": "dms_directory",
             "default_url": "/my/dms",
             "searchbar_sortings": searchbar_sortings,
@@ -159,21 +202,22 @@ class CustomerPortal(CustomerPortal):
         }
         return request.render("dms.portal_my_dms", values)
 
-    def _get_files(self, access_token, dms_directory_id, search, search_in, sort_br):
+    def _get_files_search(
+        self, access_token, dms_directory_id, search, search_in, sudo=None
+    ):
         """
-        Get files from dms_directory_id
+        Get the model and the domain to search the files of dms_directory_id
 
         :param Optional[str] access_token: access_token
         :param int dms_directory_id: dms_directory_id
         :param Optional[str] search: search
         :param Optional[str] search_in: search_in
-        :param str sort_br: sort_br
+        :param Optional[bool] sudo: Whether the access token is valid, checked
+            when not given
 
-        :return: dms_file_items
-        :rtype: odoo.model.dms_file
+        :return: file_model, file_domain
+        :rtype: tuple[odoo.model.dms_file, list]
         """
-        if not dms_directory_id:
-            return request.env["dms.file"]
         file_domain = [
             ("is_hidden", "=", False),
             ("directory_id", "=", dms_directory_id),
@@ -184,26 +228,65 @@ class CustomerPortal(CustomerPortal):
 
         # items
         file_model = request.env["dms.file"]
-        is_access_token_valid = file_model.check_access_token(access_token)
-        file_model = file_model.sudo() if is_access_token_valid else file_model
-        dms_file_items = file_model.search(file_domain, order=sort_br)
-        request.session["my_dms_file_history"] = dms_file_items.ids
+        if sudo is None:
+            directory = request.env["dms.directory"].browse(dms_directory_id)
+            sudo = directory.check_access_token(access_token)
+        file_model = file_model.sudo() if sudo else file_model
+        return file_model, file_domain
+
+    def _get_files(
+        self,
+        access_token,
+        dms_directory_id,
+        search,
+        search_in,
+        sort_br,
+        limit=None,
+        offset=0,
+        sudo=None,
+    ):
+        """
+        Get files from dms_directory_id
+
+        :param Optional[str] access_token: access_token
+        :param int dms_directory_id: dms_directory_id
+        :param Optional[str] search: search
+        :param Optional[str] search_in: search_in
+        :param str sort_br: sort_br
+        :param Optional[int] limit: limit
+        :param int offset: offset
+        :param Optional[bool] sudo: See ``_get_files_search``
+
+        :return: dms_file_items
+        :rtype: odoo.model.dms_file
+        """
+        dms_file_items = request.env["dms.file"]
+        if dms_directory_id:
+            file_model, file_domain = self._get_files_search(
+                access_token, dms_directory_id, search, search_in, sudo=sudo
+            )
+            dms_file_items = file_model.search(
+                file_domain, order=sort_br, limit=limit, offset=offset
+            )
+        request.session["my_dms_file_history"] = dms_file_items.ids[:HISTORY_LIMIT]
         return dms_file_items
 
-    def _get_directories(
-        self, access_token, dms_directory_id, search, search_in, sort_order
+    def _get_directories_search(
+        self, access_token, dms_directory_id, search, search_in, sudo=None
     ):
         """
-        Get directories from dms_directory_id
+        Get the model and the domain to search the subdirectories of
+        dms_directory_id
 
         :param Optional[str] access_token: access_token
         :param int dms_directory_id: dms_directory_id
         :param Optional[str] search: search
         :param Optional[str] search_in: search_in
-        :param str sort_order: sort_br
+        :param Optional[bool] sudo: Whether the access token is valid, checked
+            when not given
 
-        :return: dms_directory_items, res
-        :rtype: tuple[odoo.model.dms_directory, bool|odoo.model.dms_directory]
+        :return: directory_model, domain
+        :rtype: tuple[odoo.model.dms_directory, list]
         """
         # domain
         domain = [("is_hidden", "=", False), ("parent_id", "=", dms_directory_id)]
@@ -211,18 +294,227 @@ class CustomerPortal(CustomerPortal):
         if search and search_in:
             domain.append(("name", "ilike", search))
 
-        # content according to pager and archive selected
         directory_model = request.env["dms.directory"]
-        directory_to_check = directory_model.browse(dms_directory_id)
-        is_access_token_valid = directory_to_check.check_access_token(access_token)
-        directory_model = (
-            directory_model.sudo() if is_access_token_valid else directory_model
+        if sudo is None:
+            directory_to_check = directory_model.browse(dms_directory_id)
+            sudo = directory_to_check.check_access_token(access_token)
+        directory_model = directory_model.sudo() if sudo else directory_model
+        return directory_model, domain
+
+    def _get_directories(
+        self,
+        access_token,
+        dms_directory_id,
+        search,
+        search_in,
+        sort_order,
+        limit=None,
+        offset=0,
+        sudo=None,
+    ):
+        """
+        Get directories from dms_directory_id
+
+        :param Optional[str] access_token: access_token
+        :param int dms_directory_id: dms_directory_id
+        :param Optional[str] search: search
+        :param Optional[str] search_in: search_in
+        :param str sort_order: sort_br
+        :param Optional[int] limit: limit
+        :param int offset: offset
+        :param Optional[bool] sudo: See ``_get_directories_search``
+
+        :return: dms_directory_items
+        :rtype: odoo.model.dms_directory
+        """
+        directory_model, domain = self._get_directories_search(
+            access_token, dms_directory_id, search, search_in, sudo=sudo
         )
-        dms_directory_items = directory_model.search(domain, order=sort_order)
+        # content according to pager and archive selected
+        dms_directory_items = directory_model.search(
+            domain, order=sort_order, limit=limit, offset=offset
+        )
+
+        request.session["my_dms_folder_history"] = dms_directory_items.ids[
+            :HISTORY_LIMIT
+        ]
+        return dms_directory_items
 
-        request.session["my_dms_folder_history"] = dms_directory_items.ids
+    def _get_directory_content_counts(
+        self, access_token, dms_directory_id, search, search_in, sudo=None
+    ):
+        """
+        Count the subdirectories and the files of dms_directory_id
+
+        :param Optional[str] access_token: access_token
+        :param int dms_directory_id: dms_directory_id
+        :param Optional[str] search: search
+        :param Optional[str] search_in: search_in
+        :param Optional[bool] sudo: See ``_get_directories_search``
+
+        :return: The number of subdirectories and the number of files
+        :rtype: tuple[int, int]
+        """
+        directory_model, domain = self._get_directories_search(
+            access_token, dms_directory_id, search, search_in, sudo=sudo
+        )
+        file_model, file_domain = self._get_files_search(
+            access_token, dms_directory_id, search, search_in, sudo=sudo
+        )
+        return (
+            directory_model.search_count(domain),
+            file_model.search_count(file_domain),
+        )
+
+    def _get_directory_content(
+        self,
+        access_token,
+        dms_directory_id,
+        search,
+        search_in,
+        sort_order,
+        offset=0,
+        limit=None,
+        sudo=None,
+        directory_count=None,
+    ):
+        """
+        Get a page of the content of dms_directory_id, the subdirectories
+        being listed before the files
+
+        :param Optional[str] access_token: access_token
+        :param int dms_directory_id: dms_directory_id
+        :param Optional[str] search: search
+        :param Optional[str] search_in: search_in
+        :param str sort_order: sort_order
+        :param int offset: The position of the first item of the page
+        :param Optional[int] limit: The size of the page, _items_per_page by
+            default
+        :param Optional[bool] sudo: See ``_get_directories_search``
+        :param Optional[int] directory_count: The number of subdirectories,
+            counted when not given
+
+        :return: dms_directory_items, dms_file_items
+        :rtype: tuple[odoo.model.dms_directory, odoo.model.dms_file]
+        """
+        limit = limit or self._items_per_page
+        dms_directory_items = self._get_directories(
+            access_token,
+            dms_directory_id,
+            search,
+            search_in,
+            sort_order,
+            limit=limit,
+            offset=offset,
+            sudo=sudo,
+        )
+        file_limit = limit - len(dms_directory_items)
+        dms_file_items = request.env["dms.file"]
+        if file_limit:
+            # The page starts with the files when it has no directories
+            file_offset = 0
+            if not dms_directory_items:
+                if directory_count is None:
+                    directory_model, domain = self._get_directories_search(
+                        access_token, dms_directory_id, search, search_in, sudo=sudo
+                    )
+                    directory_count = directory_model.search_count(domain)
+                file_offset = max(offset - directory_count, 0)
+            dms_file_items = self._get_files(
+                access_token,
+                dms_directory_id,
+                search,
+                search_in,
+                sort_order,
+                limit=file_limit,
+                offset=file_offset,
+                sudo=sudo,
+            )
+        else:
+            request.session["my_dms_file_history"] = []
+        return dms_directory_items, dms_file_items
+
+    @http.route(
+        ["/my/dms/directory/<int:dms_directory_id>/items"],
+        type="json",
+        auth="public",
+        website=True,
+    )
+    def portal_my_dms_directory_items(
+        self,
+        dms_directory_id,
+        offset=0,
+        limit=None,
+        sortby=None,
+        search=None,
+        search_in="name",
+        access_token=None,
+        **kw,
+    ):
+        """
+        Get a page of the content of a directory, for infinite scrolling.
+
+        :param int dms_directory_id: dms_directory_id
+        :param int offset: offset
+        :param Optional[int] limit: limit
+        :param Optional[str] sortby: sortby
+        :param Optional[str] search: search
+        :param Optional[str] search_in: search_in
+        :param Optional[str] access_token: access_token
+
+        :return: The values displayed by the dms.portal_my_dms template
+        :rtype: dict
+        """
         res = self._dms_check_access("dms.directory", dms_directory_id, access_token)
-        return dms_directory_items, res
+        if not res:
+            return {"error": _("You do not have access to this directory.")}
+        try:
+            offset = max(0, int(offset or 0))
+            limit = max(0, int(limit or 0))
+        except (TypeError, ValueError):
+            return {"error": _("The offset and the limit must be integers.")}
+        limit = min(limit or self._items_per_page, self._items_per_page)
+        sort_order = self._searchbar_data(None, sortby)[3]
+        # The access token was checked along with the directory
+        sudo = bool(access_token)
+        directory_count, file_count = self._get_directory_content_counts(
+            access_token, dms_directory_id, search, search_in, sudo=sudo
+        )
+        directories, files = self._get_directory_content(
+            access_token,
+            dms_directory_id,
+            search,
+            search_in,
+            sort_order,
+            offset=offset,
+            limit=limit,
+            sudo=sudo,
+            directory_count=directory_count,
+        )
+        token_arg = ("&access_token=%s" % access_token) if access_token else ""
+        return {
+            "total": directory_count + file_count,
+            "directories": [
+                {
+                    "id": directory.id,
+                    "name": directory.name,
+                    "icon_url": directory.icon_url,
+                    "count_elements": directory.count_elements,
+                    "write_date": directory.write_date,
+                }
+                for directory in directories
+            ],
+            "files": [
+                {
+                    "id": dms_file.id,
+                    "name": dms_file.name,
+                    "icon_url": dms_file.icon_url + token_arg,
+                    "human_size": dms_file.human_size,
+                    "write_date": dms_file.write_date,
+                }
+                for dms_file in files
+            ],
+        }
 
     def _searchbar_data(self, filterby, sortby):
         """
@@ -235,9 +527,13 @@ class CustomerPortal(CustomerPortal):
         sortby
         :rtype: tuple[str, dict, dict, str, str]
         """
-        searchbar_sortings = {"name": {"label": _("Name"), "order": "name asc"}}
+        searchbar_sortings = {
+            "name": {"label": _("Name"), "order": "name asc, id"},
+            "name_desc": {"label": _("Name (Z-A)"), "order": "name desc, id"},
+            "date": {"label": _("Last update"), "order": "write_date desc, id"},
+        }
         # default sortby
-        if not sortby:
+        if sortby not in searchbar_sortings:
             sortby = "name"
         sort_order = searchbar_sortings[sortby]["order"]
         # search
@@ -279,10 +575,4 @@ class CustomerPortal(CustomerPortal):
 
         if res.attachment_id and request.env.user.has_group("base.group_portal"):
             res = res.sudo()
-        file_content = base64.b64decode(res.content)
-        content_type = ("Content-Type", "application/octet-stream")
-        disposition_content = (
-            "Content-Disposition",
-            content_disposition(res.name),
-        )
-        return request.make_response(file_content, [content_type, disposition_content])
+        return res._get_content_stream().get_response(as_attachment=True)
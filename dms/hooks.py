@@ -0,0 +1,18 @@
+# Copyright 2024 Subteno - Timothée Vannier (https://www.subteno.com).
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl).
+
+
+def uninstall_hook(env):
+    """Drop the access table and the functions created by
+    ``dms.directory.init``, which are not managed by the ORM. The triggers
+    calling the functions are dropped along with them.
+    """
+    env.cr.execute(
+        """
+        DROP TABLE IF EXISTS dms_directory_access;
+        DROP FUNCTION IF EXISTS dms_directory_access_groups_trigger() CASCADE;
+        DROP FUNCTION IF EXISTS dms_directory_access_users_trigger() CASCADE;
+        DROP FUNCTION IF EXISTS dms_directory_access_permissions_trigger() CASCADE;
+        DROP FUNCTION IF EXISTS dms_directory_access_refresh(integer[]);
+        """
+    )
@@ -0,0 +1,9 @@
+# Copyright 2024 Subteno - Timothée Vannier (https://www.subteno.com).
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl).
+from odoo import SUPERUSER_ID, api
+
+
+def migrate(cr, version):
+    """Fill the totals of the directories, they are now stored."""
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env["dms.directory"]._rebuild_totals()
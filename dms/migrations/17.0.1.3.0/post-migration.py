@@ -0,0 +1,10 @@
+# Copyright 2024 Subteno - Timothée Vannier (https://www.subteno.com).
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl).
+from odoo import SUPERUSER_ID, api
+
+
+def migrate(cr, version):
+    """Fill the paths of the files, they are now stored."""
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    directories = env["dms.directory"].with_context(active_test=False)
+    directories.search([("parent_id", "=", False)])._update_file_paths()
@@ -0,0 +1,11 @@
+# Copyright 2024 Subteno - Timothée Vannier (https://www.subteno.com).
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl).
+from odoo.tools.sql import column_exists, create_column
+
+
+def migrate(cr, version):
+    """Create the path columns of the files, so that they are filled with SQL
+    in the post-migration instead of being computed file by file."""
+    for column, column_type in [("path_names", "varchar"), ("path_json", "text")]:
+        if not column_exists(cr, "dms_file", column):
+            create_column(cr, "dms_file", column, column_type)
@@ -0,0 +1,10 @@
+# Copyright 2024 Subteno - Timothée Vannier (https://www.subteno.com).
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl).
+from odoo.tools.sql import column_exists, create_column
+
+
+def migrate(cr, version):
+    """Create the column of the pending thumbnails, so that the existing
+    thumbnails are not reset and generated again."""
+    if not column_exists(cr, "dms_file", "thumbnail_pending"):
+        create_column(cr, "dms_file", "thumbnail_pending", "boolean")
@@ -0,0 +1,66 @@
+# Copyright 2024 Subteno - Timothée Vannier (https://www.subteno.com).
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl).
+import hashlib
+
+from odoo.tools.sql import column_exists
+
+BATCH_SIZE = 100
+
+
+def migrate(cr, version):
+    """Move the contents saved in the ``content_binary`` column of the files
+    to their own blob, and drop the column."""
+    if not column_exists(cr, "dms_file", "content_binary"):
+        return
+    # The contents are read by batches of ids to bound the memory used
+    last_id = 0
+    while True:
+        cr.execute(
+            """
+            SELECT id, content_binary FROM dms_file
+            WHERE content_binary IS NOT NULL AND checksum IS NULL AND id > %s
+            ORDER BY id
+            LIMIT %s
+            """,
+            (last_id, BATCH_SIZE),
+        )
+        rows = cr.fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        checksums = [
+            (hashlib.sha1(binary).hexdigest(), file_id) for file_id, binary in rows
+        ]
+        del rows
+        cr.executemany("UPDATE dms_file SET checksum = %s WHERE id = %s", checksums)
+    cr.execute(
+        """
+        CREATE TEMPORARY TABLE dms_file_blob_migration ON COMMIT DROP AS
+        SELECT id AS file_id, nextval('dms_file_blob_id_seq') AS blob_id
+        FROM dms_file
+        WHERE content_binary IS NOT NULL
+        """
+    )
+    cr.execute(
+        """
+        INSERT INTO dms_file_blob (
+            id, checksum, content, size, shared,
+            create_uid, create_date, write_uid, write_date
+        )
+        SELECT
+            m.blob_id, f.checksum, f.content_binary,
+            octet_length(f.content_binary), FALSE,
+            f.write_uid, f.write_date, f.write_uid, f.write_date
+        FROM dms_file_blob_migration AS m
+        JOIN dms_file AS f ON f.id = m.file_id
+        """
+    )
+    cr.execute(
+        """
+        UPDATE dms_file AS f
+        SET blob_id = m.blob_id
+        FROM dms_file_blob_migration AS m
+        WHERE f.id = m.file_id
+        """
+    )
+    cr.execute("ALTER TABLE dms_file DROP COLUMN content_binary")
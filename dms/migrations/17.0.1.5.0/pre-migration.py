@@ -0,0 +1,18 @@
+# Copyright 2024 Subteno - Timothée Vannier (https://www.subteno.com).
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl).
+from odoo.tools.sql import column_exists, create_column, table_exists
+
+
+def migrate(cr, version):
+    """The existing blobs are the deduplicated ones, shared per checksum."""
+    if not table_exists(cr, "dms_file_blob"):
+        return
+    if not column_exists(cr, "dms_file_blob", "shared"):
+        create_column(cr, "dms_file_blob", "shared", "boolean")
+        cr.execute("UPDATE dms_file_blob SET shared = TRUE")
+    cr.execute(
+        """
+        ALTER TABLE dms_file_blob
+        DROP CONSTRAINT IF EXISTS dms_file_blob_checksum_uniq
+        """
+    )
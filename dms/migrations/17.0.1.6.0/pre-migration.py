@@ -0,0 +1,24 @@
+# Copyright 2024 Subteno - Timothée Vannier (https://www.subteno.com).
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl).
+from odoo.tools.sql import column_exists, create_column
+
+
+def migrate(cr, version):
+    """Fill the save type of the files with SQL, it is now stored."""
+    if column_exists(cr, "dms_file", "save_type"):
+        return
+    create_column(cr, "dms_file", "save_type", "varchar")
+    cr.execute(
+        """
+        UPDATE dms_file AS f
+        SET save_type = CASE
+            WHEN EXISTS (
+                SELECT 1 FROM ir_attachment AS a
+                WHERE a.res_model = 'dms.file'
+                    AND a.res_field = 'content_file'
+                    AND a.res_id = f.id
+            ) THEN 'file'
+            ELSE 'database'
+        END
+        """
+    )
@@ -10,6 +10,7 @@ from . import abstract_dms_mixin
 from . import storage
 from . import directory
 from . import dms_file
+from . import dms_file_blob
 
 from . import onboarding_onboarding
 from . import onboarding_onboarding_step
@@ -2,6 +2,8 @@
 
 from odoo import api, fields, models
 
+from ..tools.file import NAME_RULES
+
 
 class AbstractDmsMixin(models.AbstractModel):
     _name = "abstract.dms.mixin"
@@ -34,6 +36,21 @@ class AbstractDmsMixin(models.AbstractModel):
         string="Category",
     )
 
+    @api.model
+    def _get_name_rules(self):
+        """Get the names of the rule sets the names are checked against.
+
+        :return: A tuple of keys of ``NAME_RULES``.
+        :rtype: tuple
+        """
+        get_param = self.env["ir.config_parameter"].sudo().get_param
+        rules = get_param("dms.name_rules", default="posix")
+        return tuple(
+            rule
+            for rule in (rule.strip() for rule in rules.split(","))
+            if rule in NAME_RULES
+        ) or ("posix",)
+
     @api.model
     def search_panel_select_range(self, field_name, **kwargs):
         """Add context to display short folder name."""
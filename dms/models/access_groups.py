@@ -155,6 +155,19 @@ class DmsAccessGroups(models.Model):
             )
             record.update({"users": users, "count_users": len(users)})
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        records.directory_ids._propagate_complete_groups()
+        return records
+
+    def write(self, vals):
+        directories = self.directory_ids if "directory_ids" in vals else False
+        res = super().write(vals)
+        if directories is not False:
+            (directories | self.directory_ids)._propagate_complete_groups()
+        return res
+
     def copy(self, default=None):
         default = dict(default or {})
         default["name"] = _("%s (copy)") % self.name
@@ -5,7 +5,6 @@
 # License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl).
 
 import ast
-import base64
 import logging
 import os
 from ast import literal_eval
@@ -15,11 +14,12 @@ from typing import Literal  # noqa # pylint: disable=unused-import
 from odoo import _, api, fields, models, tools
 from odoo.exceptions import UserError, ValidationError
 from odoo.osv.expression import AND, OR
-from odoo.tools import consteq, human_size
+from odoo.tools import SQL, consteq, human_size
+from odoo.tools.sql import table_exists
 
 from odoo.addons.http_routing.models.ir_http import slugify
 
-from ..tools.file import check_name, unique_name
+from ..tools.file import NameAllocator, check_name, unique_name
 
 _logger = logging.getLogger(__name__)
 _path = os.path.dirname(os.path.dirname(__file__))
@@ -47,6 +47,7 @@ class DmsDirectory(models.Model):
     _directory_field = _parent_name
 
     parent_path = fields.Char(index="btree", unaccent=False)
+    access_token = fields.Char(index="btree_not_null")
     is_root_directory = fields.Boolean(
         default=False,
         help="""Indicates if the directory is a root directory.
@@ -109,7 +110,11 @@ class DmsDirectory(models.Model):
         readonly=True,
         store=True,
         compute_sudo=True,
-        recursive=True,
+    )
+    complete_groups_pending = fields.Boolean(
+        readonly=True,
+        copy=False,
+        help="The groups added to the subdirectories are being propagated.",
     )
     complete_name = fields.Char(
         compute="_compute_complete_name", store=True, recursive=True
@@ -177,19 +182,27 @@ class DmsDirectory(models.Model):
 
     count_elements = fields.Integer(compute="_compute_count_elements")
 
+    # Count the records the user can access
     count_total_directories = fields.Integer(
-        compute="_compute_count_total_directories", string="Total Subdirectories"
+        compute="_compute_count_total", string="Total Subdirectories"
     )
 
     count_total_files = fields.Integer(
-        compute="_compute_count_total_files", string="Total Files"
+        compute="_compute_count_total", string="Total Files"
+    )
+
+    # Count all the records, maintained incrementally, see _update_totals
+    total_directories = fields.Integer(
+        readonly=True, copy=False, groups="base.group_system"
     )
 
+    total_files = fields.Integer(readonly=True, copy=False, groups="base.group_system")
+
     count_total_elements = fields.Integer(
         compute="_compute_count_total_elements", string="Total Elements"
     )
 
-    size = fields.Float(compute="_compute_size")
+    size = fields.Float(readonly=True, copy=False)
     human_size = fields.Char(
         compute="_compute_human_size", string="Size (human readable)"
     )
@@ -211,6 +224,165 @@ class DmsDirectory(models.Model):
                 """,
     )
 
+    def init(self):
+        """Maintain the access of each user to each directory.
+
+        ``dms_directory_access`` flattens the complete groups of the
+        directories, the users of the groups and their permissions, so that
+        checking the access of a user is a single indexed lookup. It is kept
+        up to date by triggers on the tables it is computed from.
+        """
+        cr = self.env.cr
+        created = not table_exists(cr, "dms_directory_access")
+        if created:
+            cr.execute(
+                """
+                CREATE TABLE dms_directory_access (
+                    user_id integer NOT NULL
+                        REFERENCES res_users (id) ON DELETE CASCADE,
+                    directory_id integer NOT NULL
+                        REFERENCES dms_directory (id) ON DELETE CASCADE,
+                    perm_create boolean NOT NULL,
+                    perm_write boolean NOT NULL,
+                    perm_unlink boolean NOT NULL,
+                    PRIMARY KEY (user_id, directory_id)
+                );
+                CREATE INDEX dms_directory_access_directory_id_index
+                    ON dms_directory_access (directory_id);
+                """
+            )
+        cr.execute(
+            """
+            CREATE OR REPLACE FUNCTION dms_directory_access_refresh(
+                directory_ids integer[]
+            ) RETURNS void AS $$
+            BEGIN
+                DELETE FROM dms_directory_access
+                WHERE directory_id = ANY(directory_ids);
+                INSERT INTO dms_directory_access (
+                    user_id, directory_id, perm_create, perm_write, perm_unlink
+                )
+                SELECT
+                    users.uid,
+                    rel.aid,
+                    bool_or(COALESCE(dag.perm_inclusive_create, false)),
+                    bool_or(COALESCE(dag.perm_inclusive_write, false)),
+                    bool_or(COALESCE(dag.perm_inclusive_unlink, false))
+                FROM dms_directory_complete_groups_rel AS rel
+                JOIN dms_access_group AS dag ON dag.id = rel.gid
+                JOIN dms_access_group_users_rel AS users ON users.gid = dag.id
+                WHERE rel.aid = ANY(directory_ids)
+                GROUP BY users.uid, rel.aid;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            CREATE OR REPLACE FUNCTION dms_directory_access_groups_trigger()
+            RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    PERFORM dms_directory_access_refresh(
+                        ARRAY(SELECT DISTINCT aid FROM new_rows)
+                    );
+                ELSE
+                    PERFORM dms_directory_access_refresh(
+                        ARRAY(SELECT DISTINCT aid FROM old_rows)
+                    );
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            CREATE OR REPLACE FUNCTION dms_directory_access_users_trigger()
+            RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    PERFORM dms_directory_access_refresh(ARRAY(
+                        SELECT DISTINCT rel.aid
+                        FROM dms_directory_complete_groups_rel AS rel
+                        JOIN new_rows ON new_rows.gid = rel.gid
+                    ));
+                ELSE
+                    PERFORM dms_directory_access_refresh(ARRAY(
+                        SELECT DISTINCT rel.aid
+                        FROM dms_directory_complete_groups_rel AS rel
+                        JOIN old_rows ON old_rows.gid = rel.gid
+                    ));
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            CREATE OR REPLACE FUNCTION dms_directory_access_permissions_trigger()
+            RETURNS trigger AS $$
+            BEGIN
+                PERFORM dms_directory_access_refresh(ARRAY(
+                    SELECT DISTINCT rel.aid
+                    FROM new_rows
+                    JOIN old_rows ON old_rows.id = new_rows.id
+                    JOIN dms_directory_complete_groups_rel AS rel
+                        ON rel.gid = new_rows.id
+                    WHERE (
+                        new_rows.perm_inclusive_create,
+                        new_rows.perm_inclusive_write,
+                        new_rows.perm_inclusive_unlink
+                    ) IS DISTINCT FROM (
+                        old_rows.perm_inclusive_create,
+                        old_rows.perm_inclusive_write,
+                        old_rows.perm_inclusive_unlink
+                    )
+                ));
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            DROP TRIGGER IF EXISTS dms_directory_access_groups_insert
+                ON dms_directory_complete_groups_rel;
+            CREATE TRIGGER dms_directory_access_groups_insert
+                AFTER INSERT ON dms_directory_complete_groups_rel
+                REFERENCING NEW TABLE AS new_rows
+                FOR EACH STATEMENT
+                EXECUTE FUNCTION dms_directory_access_groups_trigger();
+            DROP TRIGGER IF EXISTS dms_directory_access_groups_delete
+                ON dms_directory_complete_groups_rel;
+            CREATE TRIGGER dms_directory_access_groups_delete
+                AFTER DELETE ON dms_directory_complete_groups_rel
+                REFERENCING OLD TABLE AS old_rows
+                FOR EACH STATEMENT
+                EXECUTE FUNCTION dms_directory_access_groups_trigger();
+
+            DROP TRIGGER IF EXISTS dms_directory_access_users_insert
+                ON dms_access_group_users_rel;
+            CREATE TRIGGER dms_directory_access_users_insert
+                AFTER INSERT ON dms_access_group_users_rel
+                REFERENCING NEW TABLE AS new_rows
+                FOR EACH STATEMENT
+                EXECUTE FUNCTION dms_directory_access_users_trigger();
+            DROP TRIGGER IF EXISTS dms_directory_access_users_delete
+                ON dms_access_group_users_rel;
+            CREATE TRIGGER dms_directory_access_users_delete
+                AFTER DELETE ON dms_access_group_users_rel
+                REFERENCING OLD TABLE AS old_rows
+                FOR EACH STATEMENT
+                EXECUTE FUNCTION dms_directory_access_users_trigger();
+
+            DROP TRIGGER IF EXISTS dms_directory_access_permissions_update
+                ON dms_access_group;
+            CREATE TRIGGER dms_directory_access_permissions_update
+                AFTER UPDATE ON dms_access_group
+                REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                FOR EACH STATEMENT
+                EXECUTE FUNCTION dms_directory_access_permissions_trigger();
+            """
+        )
+        if created:
+            cr.execute(
+                """
+                SELECT dms_directory_access_refresh(
+                    ARRAY(SELECT id FROM dms_directory)
+                )
+                """
+            )
+
     @api.model
     def _get_domain_by_access_groups(self, operation):
         """Special rules for directories."""
@@ -241,28 +413,36 @@ class DmsDirectory(models.Model):
         return res
 
     def check_access_token(self, access_token=False):
-        res = False
-        if access_token:
-            items = (
-                self.env["dms.directory"]
-                .sudo()
-                .search([("access_token", "=", access_token)])
-            )
-            if items:
-                item = items[0]
-                if item.id == self.id:
-                    return True
-                # sudo because the user might not usually have access to the record but
-                # now the token is valid.
-                directory_item = self.sudo()
-                while directory_item.parent_id:
-                    if directory_item.id == item.id:
-                        return True
-                    directory_item = directory_item.parent_id
-                # Fix last level
-                if directory_item.id == item.id:
-                    return True
-        return res
+        if not access_token or not self:
+            return False
+        self.ensure_one()
+        return self._is_in_access_token_directory(access_token, self.id)
+
+    @api.model
+    def _is_in_access_token_directory(self, access_token, directory_id):
+        """Check whether a directory is the directory shared with the access
+        token or one of its descendants.
+
+        Answered with a single lookup of the parent paths instead of walking
+        up the parents.
+
+        :param str access_token: The access token of the shared directory.
+        :param int directory_id: The directory to check.
+        :rtype: bool
+        """
+        self.flush_model(["access_token", "parent_path"])
+        self.env.cr.execute(
+            """
+            SELECT 1
+            FROM dms_directory AS shared
+            JOIN dms_directory AS directory
+                ON directory.parent_path LIKE shared.parent_path || '%%'
+            WHERE shared.access_token = %s AND directory.id = %s
+            LIMIT 1
+            """,
+            (access_token, directory_id),
+        )
+        return bool(self.env.cr.fetchone())
 
     @api.model
     def _get_parent_categories(self, access_token):
@@ -287,16 +467,35 @@ class DmsDirectory(models.Model):
             return [self]
         return directories
 
-    def _get_own_root_directories(self):
-        res = self.env["dms.directory"].search_read(
-            [("is_hidden", "=", False)], ["parent_id"]
+    @api.model
+    def _get_own_root_directories_domain(self):
+        """Get the domain of the accessible directories whose parent is not
+        accessible.
+
+        The parents are checked against a subquery of the accessible
+        directories, so that none of them has to be loaded.
+        """
+        domain = [("is_hidden", "=", False)]
+        accessible = self._search(domain)
+        return AND(
+            [
+                domain,
+                ["|", ("parent_id", "=", False), ("parent_id", "not in", accessible)],
+            ]
         )
-        all_ids = [value["id"] for value in res]
-        res_ids = []
-        for item in res:
-            if not item["parent_id"] or item["parent_id"][0] not in all_ids:
-                res_ids.append(item["id"])
-        return res_ids
+
+    @api.model
+    def _get_own_root_directories(self, count=False):
+        """Get the top-most directories accessible by the user.
+
+        :param bool count: Only count the directories.
+        :return: The ids of the directories, or their number with ``count``.
+        :rtype: list|int
+        """
+        domain = self._get_own_root_directories_domain()
+        if count:
+            return self.search_count(domain)
+        return self.search(domain).ids
 
     allowed_model_ids = fields.Many2many(
         related="storage_id.model_ids",
@@ -429,22 +628,47 @@ class DmsDirectory(models.Model):
         for record in self:
             record.count_elements = record.count_files + record.count_directories
 
-    def _compute_count_total_directories(self):
-        for record in self:
-            count = (
-                self.search_count([("id", "child_of", record.id)]) if record.id else 0
+    def _compute_count_total(self):
+        if self.env.su:
+            for record in self:
+                record.count_total_directories = record.total_directories
+                record.count_total_files = record.total_files
+            return
+        counts = {}
+        # Prevent error in some NewId cases
+        if self.ids:
+            self.env["dms.file"].flush_model(["directory_id"])
+            self.flush_model(["parent_path"])
+            self.env.cr.execute(
+                SQL(
+                    """
+                    SELECT
+                        d.id,
+                        (
+                            SELECT COUNT(*) FROM dms_directory AS sub
+                            WHERE sub.parent_path LIKE d.parent_path || '%%'
+                                AND sub.id != d.id
+                                AND sub.id IN (%s)
+                        ),
+                        (
+                            SELECT COUNT(*) FROM dms_file AS f
+                            JOIN dms_directory AS sub ON sub.id = f.directory_id
+                            WHERE sub.parent_path LIKE d.parent_path || '%%'
+                                AND f.id IN (%s)
+                        )
+                    FROM dms_directory AS d
+                    WHERE d.id IN %s
+                    """,
+                    self._search([]).subselect(),
+                    self.env["dms.file"]._search([]).subselect(),
+                    tuple(self.ids),
+                )
             )
-            record.count_total_directories = count - 1 if count > 0 else 0
-
-    def _compute_count_total_files(self):
-        model = self.env["dms.file"]
+            counts = {row[0]: row[1:] for row in self.env.cr.fetchall()}
         for record in self:
-            # Prevent error in some NewId cases
-            record.count_total_files = (
-                model.search_count([("directory_id", "child_of", record.id)])
-                if record.id
-                else 0
-            )
+            directories, files = counts.get(record.id, (0, 0))
+            record.count_total_directories = directories
+            record.count_total_files = files
 
     def _compute_count_total_elements(self):
         for record in self:
@@ -452,37 +676,268 @@ class DmsDirectory(models.Model):
                 record.count_total_files + record.count_total_directories
             )
 
-    def _compute_size(self):
-        sudo_model = self.env["dms.file"].sudo()
-        for record in self:
-            # Avoid NewId
-            if not record.id:
-                record.size = 0
-                continue
-            recs = sudo_model.search_read(
-                domain=[("directory_id", "child_of", record.id)],
-                fields=["size"],
+    @api.model
+    def _update_totals(self, deltas):
+        """Apply deltas to the totals of directories and all their ancestors.
+
+        :param dict deltas: ``{directory_id: (size, files, directories)}``
+        """
+        deltas = {key: value for key, value in deltas.items() if key and any(value)}
+        if not deltas:
+            return
+        self.flush_model()
+        self.env.cr.execute(
+            """
+            UPDATE dms_directory AS d
+            SET size = d.size + delta.size,
+                total_files = d.total_files + delta.files,
+                total_directories = d.total_directories + delta.directories
+            FROM (
+                SELECT
+                    ancestor_id::int AS id,
+                    SUM(v.size) AS size,
+                    SUM(v.files) AS files,
+                    SUM(v.directories) AS directories
+                FROM unnest(%s::int[], %s::float8[], %s::int[], %s::int[])
+                    AS v(directory_id, size, files, directories)
+                JOIN dms_directory AS src ON src.id = v.directory_id
+                CROSS JOIN LATERAL unnest(
+                    string_to_array(rtrim(src.parent_path, '/'), '/')
+                ) AS ancestor_id
+                GROUP BY ancestor_id
+            ) AS delta
+            WHERE d.id = delta.id
+            """,
+            (
+                list(deltas),
+                [value[0] for value in deltas.values()],
+                [value[1] for value in deltas.values()],
+                [value[2] for value in deltas.values()],
+            ),
+        )
+        self.invalidate_model(["size", "total_files", "total_directories"])
+
+    def _update_file_paths(self):
+        """Update the paths of the files in the directories and all their
+        subdirectories with a single statement, after a rename or a move.
+        """
+        if not self:
+            return
+        self.flush_model(["name", "parent_path"])
+        self.env["dms.file"].flush_model(["name", "directory_id"])
+        self.env.cr.execute(
+            """
+            WITH directories AS (
+                SELECT
+                    d.id,
+                    string_agg(ancestor.name, '/' ORDER BY path.depth) AS names,
+                    bool_and(COALESCE(ancestor.name, '') != '') AS named,
+                    jsonb_agg(
+                        jsonb_build_object(
+                            'model', 'dms.directory',
+                            'name', ancestor.name,
+                            'id', ancestor.id
+                        )
+                        ORDER BY path.depth
+                    ) AS json
+                FROM dms_directory AS d
+                CROSS JOIN LATERAL unnest(
+                    string_to_array(rtrim(d.parent_path, '/'), '/')::int[]
+                ) WITH ORDINALITY AS path(ancestor_id, depth)
+                JOIN dms_directory AS ancestor ON ancestor.id = path.ancestor_id
+                WHERE d.parent_path LIKE ANY(%s)
+                GROUP BY d.id
             )
-            record.size = sum(rec.get("size", 0) for rec in recs)
+            UPDATE dms_file AS f
+            SET path_names = CASE
+                    WHEN directories.named AND COALESCE(f.name, '') != ''
+                    THEN directories.names || '/' || f.name
+                    ELSE ''
+                END,
+                path_json = (
+                    directories.json
+                    || jsonb_build_object(
+                        'model', 'dms.file', 'name', f.name, 'id', f.id
+                    )
+                )::text
+            FROM directories
+            WHERE f.directory_id = directories.id
+            """,
+            (["%s%%" % path for path in self.mapped("parent_path")],),
+        )
+        self.env["dms.file"].invalidate_model(["path_names", "path_json"])
+
+    @api.model
+    def _rebuild_totals(self):
+        """Recompute the totals of all the directories from scratch."""
+        self.env["dms.file"].flush_model(["directory_id", "size", "active"])
+        self.flush_model()
+        self.env.cr.execute(
+            """
+            UPDATE dms_directory AS d
+            SET size = totals.size,
+                total_files = totals.files,
+                total_directories = totals.directories
+            FROM (
+                SELECT
+                    ancestor_id::int AS id,
+                    COALESCE(SUM(files.size), 0) AS size,
+                    COALESCE(SUM(files.count), 0) AS files,
+                    COUNT(*) - 1 AS directories
+                FROM dms_directory AS sub
+                CROSS JOIN LATERAL unnest(
+                    string_to_array(rtrim(sub.parent_path, '/'), '/')
+                ) AS ancestor_id
+                LEFT JOIN (
+                    SELECT directory_id, SUM(size) AS size, COUNT(*) AS count
+                    FROM dms_file
+                    WHERE active
+                    GROUP BY directory_id
+                ) AS files ON files.directory_id = sub.id
+                GROUP BY ancestor_id
+            ) AS totals
+            WHERE d.id = totals.id
+            """
+        )
+        self.invalidate_model(["size", "total_files", "total_directories"])
+
+    def _get_parent_totals(self, sign=1):
+        """Get what the directories add to the totals of their parents.
+
+        :param int sign: -1 to get what removing the directories subtracts.
+        :return: The deltas to apply with ``_update_totals``.
+        :rtype: dict
+        """
+        deltas = defaultdict(lambda: [0.0, 0, 0])
+        for record in self.sudo():
+            delta = deltas[record.parent_id.id]
+            delta[0] += sign * record.size
+            delta[1] += sign * record.total_files
+            delta[2] += sign * (record.total_directories + 1)
+        return deltas
 
     @api.depends("size")
     def _compute_human_size(self):
         for item in self:
             item.human_size = human_size(item.size) if item.size else False
 
-    @api.depends(
-        "group_ids",
-        "inherit_group_ids",
-        "parent_id.complete_group_ids",
-        "parent_path",
-    )
+    @api.depends("group_ids", "inherit_group_ids", "parent_id")
     def _compute_groups(self):
-        """Get all DMS security groups affecting this directory."""
+        """Get all DMS security groups affecting this directory.
+
+        Subdirectories are not recomputed by the ORM, changes are propagated
+        to them by ``_propagate_complete_groups``.
+        """
         for one in self:
             groups = one.group_ids
             if one.inherit_group_ids:
                 groups |= one.parent_id.complete_group_ids
-            self.complete_group_ids = groups
+            one.complete_group_ids = groups
+
+    def _propagate_complete_groups(self, defer=True):
+        """Recompute the complete groups of the directories and all their
+        subdirectories with a few set-based statements.
+
+        When ``dms.complete_groups_defer_threshold`` is set and the directories
+        have more subdirectories than it, the added groups are propagated by a
+        scheduled action. The removed groups are always propagated right away,
+        so that revoked access takes effect immediately.
+
+        :param bool defer: Whether the propagation may be deferred.
+        """
+        if not self:
+            return
+        self.flush_model()
+        self.env["dms.access.group"].flush_model()
+        cr = self.env.cr
+        paths = ["%s%%" % path for path in self.sudo().mapped("parent_path")]
+        threshold = int(
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("dms.complete_groups_defer_threshold", default=0)
+        )
+        deferred = False
+        if defer and threshold:
+            cr.execute(
+                "SELECT COUNT(*) FROM dms_directory WHERE parent_path LIKE ANY(%s)",
+                (paths,),
+            )
+            deferred = cr.fetchone()[0] > threshold
+        # A directory gets the groups of its ancestors up to the closest one
+        # that does not inherit groups (itself included)
+        complete_groups = SQL(
+            """
+            WITH paths AS (
+                SELECT
+                    d.id,
+                    path.ancestor_id,
+                    path.depth,
+                    ancestor.inherit_group_ids IS NOT TRUE AS breaks
+                FROM dms_directory AS d
+                CROSS JOIN LATERAL unnest(
+                    string_to_array(rtrim(d.parent_path, '/'), '/')::int[]
+                ) WITH ORDINALITY AS path(ancestor_id, depth)
+                JOIN dms_directory AS ancestor ON ancestor.id = path.ancestor_id
+                WHERE d.parent_path LIKE ANY(%s)
+            ),
+            cutoffs AS (
+                SELECT id, COALESCE(MAX(depth) FILTER (WHERE breaks), 1) AS depth
+                FROM paths
+                GROUP BY id
+            ),
+            complete_groups AS (
+                SELECT DISTINCT paths.id AS aid, rel.gid
+                FROM paths
+                JOIN cutoffs
+                    ON cutoffs.id = paths.id AND paths.depth >= cutoffs.depth
+                JOIN dms_directory_groups_rel AS rel
+                    ON rel.aid = paths.ancestor_id
+            )
+            """,
+            paths,
+        )
+        cr.execute(
+            SQL(
+                """
+                %s
+                DELETE FROM dms_directory_complete_groups_rel AS rel
+                USING dms_directory AS d
+                WHERE rel.aid = d.id
+                    AND d.parent_path LIKE ANY(%s)
+                    AND NOT EXISTS (
+                        SELECT 1 FROM complete_groups AS cg
+                        WHERE cg.aid = rel.aid AND cg.gid = rel.gid
+                    )
+                """,
+                complete_groups,
+                paths,
+            )
+        )
+        if deferred:
+            self.sudo().write({"complete_groups_pending": True})
+            self.env.ref("dms.ir_cron_propagate_complete_groups")._trigger()
+        else:
+            cr.execute(
+                SQL(
+                    """
+                    %s
+                    INSERT INTO dms_directory_complete_groups_rel (aid, gid)
+                    SELECT aid, gid FROM complete_groups
+                    ON CONFLICT DO NOTHING
+                    """,
+                    complete_groups,
+                )
+            )
+        self.invalidate_model(["complete_group_ids"])
+        self.env["dms.access.group"].invalidate_model(["complete_directory_ids"])
+
+    @api.model
+    def _cron_propagate_complete_groups(self):
+        """Finish the deferred propagations of complete groups."""
+        directories = self.sudo().search([("complete_groups_pending", "=", True)])
+        for directory in directories:
+            directory._propagate_complete_groups(defer=False)
+            directory.complete_groups_pending = False
 
     # View
     @api.depends("is_root_directory")
@@ -566,21 +1021,40 @@ class DmsDirectory(models.Model):
 
     @api.constrains("name")
     def _check_name(self):
+        rules = self._get_name_rules()
         for record in self:
-            if self.env.context.get("check_name", True) and not check_name(record.name):
-                raise ValidationError(_("The directory name is invalid."))
-            if record.is_root_directory:
-                children = record.sudo().storage_id.root_directory_ids
-            else:
-                children = record.sudo().parent_id.child_directory_ids
-
-            if children.filtered(
-                lambda child, record=record: child.name == record.name
-                and child != record
+            if self.env.context.get("check_name", True) and not check_name(
+                record.name, rules
             ):
-                raise ValidationError(
-                    _("A directory with the same name already exists.")
+                raise ValidationError(_("The directory name is invalid."))
+        # Root directories are siblings of the other root directories of their
+        # storage
+        self.flush_model(["name", "parent_id", "storage_id"])
+        self.env.cr.execute(
+            """
+            SELECT checked.name
+            FROM dms_directory AS d
+            JOIN (
+                SELECT DISTINCT parent_id, storage_id, name
+                FROM dms_directory
+                WHERE id IN %s
+            ) AS checked
+                ON checked.name = d.name
+                AND checked.parent_id IS NOT DISTINCT FROM d.parent_id
+                AND (d.parent_id IS NOT NULL OR checked.storage_id = d.storage_id)
+            GROUP BY checked.parent_id, checked.storage_id, checked.name
+            HAVING COUNT(*) > 1
+            """,
+            (tuple(self.ids),),
+        )
+        names = [row[0] for row in self.env.cr.fetchall()]
+        if names:
+            raise ValidationError(
+                _(
+                    "A directory with the same name already exists: %(names)s",
+                    names=", ".join(names),
                 )
+            )
 
     # Create, Update, Delete
     def _inverse_starred(self):
@@ -604,7 +1078,7 @@ class DmsDirectory(models.Model):
             names = self.sudo().storage_id.root_directory_ids.mapped("name")
         else:
             names = self.sudo().parent_id.child_directory_ids.mapped("name")
-        default.update({"name": unique_name(self.name, names)})
+        default.update({"name": NameAllocator(names).allocate(self.name)})
         return super().copy(default)
 
     def _alias_get_creation_values(self):
@@ -641,19 +1115,20 @@ class DmsDirectory(models.Model):
         return super().message_update(msg_dict, update_vals=update_vals)
 
     def _process_message(self, msg_dict, extra_values=False):
-        names = self.sudo().file_ids.mapped("name")
+        names = NameAllocator(self.sudo().file_ids.mapped("name"), escape_suffix=True)
+        vals_list = []
+        binaries = []
         for attachment in msg_dict["attachments"]:
-            uname = unique_name(attachment.fname, names, escape_suffix=True)
-            vals = {
-                "directory_id": self.id,
-                "name": uname,
-            }
-            try:
-                vals["content"] = base64.b64encode(attachment.content)
-            except Exception:
-                vals["content"] = attachment.content
-            self.env["dms.file"].sudo().create(vals)
-            names.append(uname)
+            vals_list.append(
+                {
+                    "directory_id": self.id,
+                    "name": names.allocate(attachment.fname),
+                }
+            )
+            content = attachment.content
+            binaries.append(content.encode() if isinstance(content, str) else content)
+        if vals_list:
+            self.env["dms.file"].sudo()._create_from_binaries(vals_list, binaries)
 
     @api.model_create_multi
     def create(self, vals_list):
@@ -667,6 +1142,12 @@ class DmsDirectory(models.Model):
         ctx.update({"default_parent_id": False})
         self.env.registry.clear_cache()
         res = super(DmsDirectory, self.with_context(**ctx)).create(vals_list)
+        # The files and subdirectories created with the directories, like when
+        # copying them, already added themselves to the totals of the ancestors
+        deltas = defaultdict(lambda: [0.0, 0, 0])
+        for record in res:
+            deltas[record.parent_id.id][2] += 1
+        self._update_totals(deltas)
         return res
 
     def write(self, vals):
@@ -687,15 +1168,21 @@ class DmsDirectory(models.Model):
                         )
                 elif old_storage_id != new_storage_id:
                     raise UserError(_("It is not possible to change the storage."))
+        moving = any(key in vals for key in ["parent_id", "is_root_directory"])
+        if moving:
+            deltas = self._get_parent_totals(sign=-1)
+        res = super().write(vals)
         # Groups part
-        if any(key in vals for key in ["group_ids", "inherit_group_ids"]):
-            res = super().write(vals)
-            domain = [("id", "child_of", self.ids)]
-            records = self.sudo().search(domain)
-            records.modified(["group_ids"])
-            records.flush_recordset()
-        else:
-            res = super().write(vals)
+        if moving or any(key in vals for key in ["group_ids", "inherit_group_ids"]):
+            self._propagate_complete_groups()
+        if moving or "name" in vals:
+            self._update_file_paths()
+        if moving:
+            for parent_id, delta in self._get_parent_totals().items():
+                deltas[parent_id] = [
+                    a + b for a, b in zip(deltas[parent_id], delta, strict=True)
+                ]
+            self._update_totals(deltas)
         return res
 
     def unlink(self):
@@ -707,7 +1194,9 @@ class DmsDirectory(models.Model):
         self.file_ids.unlink()
         if self.child_directory_ids:
             self.child_directory_ids.unlink()
-        return super(DmsDirectory, self.exists()).unlink()
+        records = self.exists()
+        self._update_totals(records._get_parent_totals(sign=-1))
+        return super(DmsDirectory, records).unlink()
 
     @api.model
     def _search_panel_domain_image(
@@ -13,12 +13,12 @@ from collections import defaultdict
 from PIL import Image
 
 from odoo import _, api, fields, models, tools
-from odoo.exceptions import UserError, ValidationError
+from odoo.exceptions import MissingError, UserError, ValidationError
+from odoo.http import Stream
 from odoo.osv import expression
-from odoo.tools import consteq, human_size
-from odoo.tools.mimetypes import guess_mimetype
+from odoo.tools import SQL, consteq, human_size
 
-from ..tools import file
+from ..tools import file, image
 
 _logger = logging.getLogger(__name__)
 
@@ -63,18 +63,20 @@ class DMSFile(models.Model):
         prefetch=False,
     )
 
+    # Directory renames and moves are applied by _update_file_paths
     path_names = fields.Char(
         compute="_compute_path",
         compute_sudo=True,
         readonly=True,
-        store=False,
+        store=True,
+        index="trigram",
     )
 
     path_json = fields.Text(
         compute="_compute_path",
         compute_sudo=True,
         readonly=True,
-        store=False,
+        store=True,
     )
 
     tag_ids = fields.Many2many(
@@ -111,12 +113,20 @@ class DMSFile(models.Model):
 
     checksum = fields.Char(string="Checksum/SHA1", readonly=True, index="btree")
 
-    content_binary = fields.Binary(attachment=False, prefetch=False)
+    blob_id = fields.Many2one(
+        comodel_name="dms.file.blob",
+        string="Content Blob",
+        ondelete="restrict",
+        index="btree_not_null",
+        readonly=True,
+        prefetch=False,
+    )
 
     save_type = fields.Char(
         compute="_compute_save_type",
         string="Current Save Type",
-        prefetch=False,
+        compute_sudo=True,
+        store=True,
     )
 
     migration = fields.Char(
@@ -134,21 +144,113 @@ class DMSFile(models.Model):
 
     # Extend inherited field(s)
     image_1920 = fields.Image(compute="_compute_image_1920", store=True, readonly=False)
+    thumbnail_pending = fields.Boolean(
+        compute="_compute_image_1920", store=True, index=True, copy=False
+    )
 
-    @api.depends("mimetype", "content")
+    @api.depends("mimetype", "checksum", "attachment_id")
     def _compute_image_1920(self):
-        """Provide thumbnail automatically if possible."""
-        for one in self.filtered("mimetype"):
-            # Image.MIME provides a dict of mimetypes supported by Pillow,
-            # SVG is not present in the dict but is also a supported image format
-            # lacking a better solution, it's being added manually
-            # Some component modifies the PIL dictionary by adding PDF as a valid
-            # image type, so it must be explicitly excluded.
-            if one.mimetype != "application/pdf" and one.mimetype in (
-                *Image.MIME.values(),
-                "image/svg+xml",
-            ):
-                one.image_1920 = one.content
+        """Queue the generation of the thumbnail if possible, the icon of the
+        extension is shown until ``_cron_generate_thumbnails`` generates it."""
+        renderers = self._get_thumbnail_renderers()
+        for one in self:
+            one.image_1920 = False
+            one.thumbnail_pending = one.mimetype in renderers
+        if any(self.mapped("thumbnail_pending")):
+            cron = self.env.ref("dms.ir_cron_generate_thumbnails", False)
+            if cron:
+                cron._trigger()
+
+    @api.model
+    def _get_thumbnail_renderers(self):
+        """Get the functions generating the thumbnails per mimetype.
+
+        The functions are called with the raw content and the maximum number
+        of pixels to decode, and return the base64 encoded thumbnail. The
+        functions of ``tools/image.py`` are called in worker processes, the
+        other ones in the scheduled action itself.
+
+        :return: A dict of ``{mimetype: function}``.
+        :rtype: dict
+        """
+        # Image.MIME provides a dict of mimetypes supported by Pillow,
+        # SVG is not present in the dict but is also a supported image format
+        # lacking a better solution, it's being added manually
+        # Some component modifies the PIL dictionary by adding PDF as a valid
+        # image type, so it must be explicitly excluded.
+        renderers = dict.fromkeys(
+            (*Image.MIME.values(), "image/svg+xml"), image.generate_thumbnail
+        )
+        renderers.pop("application/pdf", None)
+        if image.find_program("pdftoppm"):
+            renderers["application/pdf"] = image.render_pdf
+            if image.find_program("soffice", "libreoffice"):
+                renderers.update(
+                    dict.fromkeys(image.OFFICE_MIMETYPES, image.render_office)
+                )
+        return renderers
+
+    @api.model
+    def _cron_generate_thumbnails(self, batch_size=None):
+        """Generate the pending thumbnails.
+
+        The thumbnails are rendered by ``dms.thumbnail_workers`` new Python
+        processes, or by the cron itself if it is not set. Files with
+        the same checksum share their thumbnail, which is rendered once. The
+        images with more pixels than ``dms.thumbnail_max_pixels`` are not
+        decoded.
+
+        :param int batch_size: The number of thumbnails generated per run, by
+            default the ``dms.thumbnail_batch_size`` system parameter.
+        """
+        get_param = self.env["ir.config_parameter"].sudo().get_param
+        batch_size = batch_size or int(get_param("dms.thumbnail_batch_size", 100))
+        workers = int(get_param("dms.thumbnail_workers", 0))
+        max_pixels = int(get_param("dms.thumbnail_max_pixels", 50000000))
+        domain = [("thumbnail_pending", "=", True)]
+        files = self.sudo().with_context(active_test=False)
+        records = files.search(domain, order="id", limit=batch_size)
+        # Thumbnails already rendered for the same contents, read from one
+        # file per checksum
+        checksums = set(records.mapped("checksum")) - {False}
+        sources = files._read_group(
+            [
+                ("checksum", "in", list(checksums)),
+                ("thumbnail_pending", "=", False),
+                ("image_1920", "!=", False),
+            ],
+            groupby=["checksum"],
+            aggregates=["id:min"],
+        )
+        thumbnails = {
+            checksum: files.browse(source_id).image_1920
+            for checksum, source_id in sources
+        }
+        renderers = self._get_thumbnail_renderers()
+        tasks = {}
+        for record in records:
+            key = record.checksum or record.id
+            renderer = renderers.get(record.mimetype)
+            if renderer and key not in thumbnails and key not in tasks:
+                tasks[key] = (renderer, record._get_content_stream().read())
+        if workers > 1 and len(tasks) > 1:
+            results = image.render_in_processes(
+                list(tasks.values()), max_pixels, workers
+            )
+        else:
+            results = [
+                renderer(binary, max_pixels) for renderer, binary in tasks.values()
+            ]
+        thumbnails.update(zip(tasks, results, strict=True))
+        for record in records:
+            record.write(
+                {
+                    "image_1920": thumbnails.get(record.checksum or record.id, False),
+                    "thumbnail_pending": False,
+                }
+            )
+        if files.search_count(domain, limit=1):
+            self.env.ref("dms.ir_cron_generate_thumbnails")._trigger()
 
     def check_access_rule(self, operation):
         self.mapped("directory_id").check_access_rule(operation)
@@ -161,30 +263,14 @@ class DMSFile(models.Model):
         return res
 
     def check_access_token(self, access_token=False):
-        if not access_token:
+        if not access_token or not self:
             return False
-
+        self.ensure_one()
         if self.access_token and consteq(self.access_token, access_token):
             return True
-
-        items = (
-            self.env["dms.directory"]
-            .sudo()
-            .search([("access_token", "=", access_token)])
+        return self.env["dms.directory"]._is_in_access_token_directory(
+            access_token, self.directory_id.id
         )
-        if items:
-            item = items[0]
-            if self.directory_id.id == item.id:
-                return True
-            directory_item = self.directory_id
-            while directory_item.parent_id:
-                if directory_item.id == self.directory_id.id:
-                    return True
-                directory_item = directory_item.parent_id
-            # Fix last level
-            if directory_item.id == self.directory_id.id:
-                return True
-        return False
 
     res_model = fields.Char(
         string="Linked attachments model", related="directory_id.res_model"
@@ -209,20 +295,41 @@ class DMSFile(models.Model):
 
     @api.model
     def _get_content_inital_vals(self):
-        return {"content_binary": False, "content_file": False}
+        return {"content_file": False, "blob_id": False}
+
+    @api.model
+    def _get_binary_vals(self, storage, binary):
+        """Get the values computed from a raw content saved in a storage.
+
+        The content itself is not included for the filestore and attachment
+        save types.
+
+        :param odoo.model.dms_storage storage: The storage of the content.
+        :param bytes binary: The raw content.
+        :rtype: dict
+        """
+        vals = {
+            "checksum": self._get_checksum(binary),
+            "size": binary and len(binary) or 0,
+        }
+        if storage.save_type not in ["file", "attachment"] and binary:
+            blob = (
+                self.env["dms.file.blob"]
+                .sudo()
+                ._get_or_create(
+                    vals["checksum"],
+                    binary,
+                    shared=storage.deduplicate_content,
+                )
+            )
+            vals["blob_id"] = blob.id
+        return vals
 
     def _update_content_vals(self, vals, binary):
         new_vals = vals.copy()
-        new_vals.update(
-            {
-                "checksum": self._get_checksum(binary),
-                "size": binary and len(binary) or 0,
-            }
-        )
+        new_vals.update(self._get_binary_vals(self.storage_id, binary))
         if self.storage_id.save_type in ["file", "attachment"]:
             new_vals["content_file"] = self.content
-        else:
-            new_vals["content_binary"] = self.content and binary
         return new_vals
 
     @api.model
@@ -242,28 +349,128 @@ class DMSFile(models.Model):
     def _get_icon_placeholder_name(self):
         return self.extension and "file_%s.svg" % self.extension or ""
 
+    def _get_content_stream(self):
+        """Get a stream over the file content without decoding it in memory.
+
+        Filestore and attachment backed contents are served from their
+        ``ir.attachment`` so that the response can be sent from disk
+        (``X-Sendfile`` when enabled). Only database stored contents are
+        buffered. The checksum is used as ETag so that the response supports
+        conditional (``If-None-Match``) and partial (``Range``) requests.
+
+        :return: The stream of the file content.
+        :rtype: odoo.http.Stream
+        """
+        self.ensure_one()
+        ir_binary = self.env["ir.binary"]
+        if self.attachment_id:
+            stream = Stream.from_attachment(self.attachment_id.sudo())
+        else:
+            try:
+                stream = ir_binary._record_to_stream(self, "content_file")
+            except MissingError:
+                blob = self.sudo().blob_id
+                binary = blob._read() if blob else b""
+                stream = Stream(
+                    type="data",
+                    data=binary,
+                    size=len(binary),
+                    last_modified=self.write_date,
+                )
+        stream.mimetype = "application/octet-stream"
+        stream.download_name = self.name
+        stream.etag = self.checksum or stream.etag
+        stream.conditional = True
+        return stream
+
     # Actions
     def action_migrate(self, should_logging=True):
-        record_count = len(self)
-        index = 1
-        for dms_file in self:
-            if should_logging:
-                _logger.info(
-                    _(
-                        "Migrate File %(index)s of %(record_count)s [ %("
-                        "dms_file_migration)s ]",
-                        index=index,
-                        record_count=record_count,
-                        dms_file_migration=dms_file.migration,
-                    )
+        if should_logging:
+            _logger.info(
+                _(
+                    "Migrate %(record_count)s files",
+                    record_count=len(self),
                 )
-                index += 1
-            dms_file.write(
-                {
-                    "content": dms_file.with_context(**{}).content,
-                    "storage_id": dms_file.directory_id.storage_id.id,
-                }
             )
+        self._migrate_content()
+
+    def _migrate_content(self):
+        """Move the content of the files to the save type of their storage.
+
+        The bytes are copied as is between the blobs and the filestore,
+        without being encoded in base64. As the content does not change, the
+        fields computed from it are not recomputed. The content of the files
+        of the other save types is written again through ``content``.
+        """
+        files = (
+            self.sudo().with_context(active_test=False).filtered("require_migration")
+        )
+        if not files:
+            return
+        protected = [
+            files._fields[name]
+            for name in (
+                "content",
+                "extension",
+                "mimetype",
+                "image_1920",
+                "thumbnail_pending",
+            )
+        ]
+        to_file = files.filtered(lambda f: f.storage_id.save_type == "file")
+        to_database = files.filtered(lambda f: f.storage_id.save_type == "database")
+        for record in files - to_file - to_database:
+            record.write({"content": record.with_context(bin_size=False).content})
+        with self.env.protecting(protected, files):
+            if to_file:
+                to_file.flush_recordset(["blob_id"])
+                self.env.cr.execute(
+                    """
+                    SELECT f.id, blob.content
+                    FROM dms_file AS f
+                    LEFT JOIN dms_file_blob AS blob ON blob.id = f.blob_id
+                    WHERE f.id IN %s
+                    """,
+                    (tuple(to_file.ids),),
+                )
+                self.env["ir.attachment"].sudo().create(
+                    [
+                        {
+                            "name": "content_file",
+                            "res_model": self._name,
+                            "res_field": "content_file",
+                            "res_id": file_id,
+                            "type": "binary",
+                            "raw": bytes(binary or b""),
+                        }
+                        for file_id, binary in self.env.cr.fetchall()
+                    ]
+                )
+                to_file.invalidate_recordset(["content_file"])
+                to_file.write({"blob_id": False})
+            if to_database:
+                attachments = (
+                    self.env["ir.attachment"]
+                    .sudo()
+                    .search(
+                        [
+                            ("res_model", "=", self._name),
+                            ("res_field", "=", "content_file"),
+                            ("res_id", "in", to_database.ids),
+                        ]
+                    )
+                )
+                for attachment in attachments:
+                    record = to_database.browse(attachment.res_id)
+                    binary = attachment.raw
+                    if binary:
+                        blob = self.env["dms.file.blob"]._get_or_create(
+                            record.checksum or self._get_checksum(binary),
+                            binary,
+                            shared=record.storage_id.deduplicate_content,
+                        )
+                        record.write({"blob_id": blob.id})
+                to_database.write({"content_file": False})
 
     def action_save_onboarding_file_step(self):
         self.env.user.company_id.set_onboarding_step_done(
@@ -298,14 +505,40 @@ class DMSFile(models.Model):
     def _search_panel_domain(self, field, operator, directory_id, comodel_domain=False):
         if not comodel_domain:
             comodel_domain = []
-        files_ids = self.search([("directory_id", operator, directory_id)]).ids
-        return expression.AND([comodel_domain, [(field, "in", files_ids)]])
+        # Subquery of the accessible files, their ids are never loaded
+        files = self._search([("directory_id", operator, directory_id)])
+        return expression.AND([comodel_domain, [(field, "in", files)]])
+
+    @api.model
+    def _search_panel_files(self, **kwargs):
+        """Get the query of the accessible files matching the current search
+        and the selections of the search panel.
+
+        :return: The query selecting the ids of the files.
+        :rtype: odoo.tools.query.Query
+        """
+        operator, directory_id = self._search_panel_directory(**kwargs)
+        domain = expression.AND(
+            [
+                kwargs.get("search_domain", []),
+                kwargs.get("category_domain", []),
+                kwargs.get("filter_domain", []),
+            ]
+        )
+        if directory_id:
+            domain = expression.AND(
+                [domain, [("directory_id", operator, directory_id)]]
+            )
+        return self._search(domain)
 
     @api.model
     def search_panel_select_range(self, field_name, **kwargs):
         """This method is overwritten to make it 'similar' to v13.
         The goal is that the directory searchpanel shows all directories
         (even if some folders have no files).
+
+        The tree is read with a single query, and the counters with a single
+        grouping of the files by directory.
         """
         if field_name != "directory_id":
             context = {}
@@ -315,72 +548,104 @@ class DMSFile(models.Model):
                 DMSFile, self.with_context(**context)
             ).search_panel_select_range(field_name, **kwargs)
 
+        directory_model = self.env["dms.directory"]
         domain = [("is_hidden", "=", False)]
         # If we pass by context something, we filter more about it we filter
         # the directories of the files, or we show all of them
         if self.env.context.get("active_model") == "dms.directory":
             active_id = self.env.context.get("active_id")
-            files = self.env["dms.file"].search(
-                [("directory_id", "child_of", active_id)]
+            domain.append(("id", "in", self._get_directory_path_ids(active_id)))
+        directory_model.flush_model(["complete_name", "parent_id"])
+        self.env.cr.execute(
+            SQL(
+                """
+                SELECT id, complete_name, parent_id
+                FROM dms_directory
+                WHERE id IN (%s)
+                ORDER BY complete_name, id
+                """,
+                directory_model._search(domain).subselect(),
             )
-            all_directory_ids = []
-            for file_record in files:
-                directory = file_record.directory_id
-                while directory:
-                    all_directory_ids.append(directory.id)
-                    directory = directory.parent_id
-            domain.append(("id", "in", all_directory_ids))
-        # Get all possible directories
-        comodel_records = (
-            self.env["dms.directory"]
-            .with_context(directory_short_name=True)
-            .search_read(domain, ["display_name", "parent_id"])
         )
-        all_record_ids = [rec["id"] for rec in comodel_records]
+        rows = self.env.cr.fetchall()
+        all_record_ids = {row[0] for row in rows}
         field_range = {}
-        enable_counters = kwargs.get("enable_counters")
-        for record in comodel_records:
-            record_id = record["id"]
-            parent = record["parent_id"]
-            record_values = {
+        for record_id, name, parent in rows:
+            # If the parent directory is not in all the records we should not
+            # set parent_id because the user does not have access to parent.
+            if parent not in all_record_ids:
+                parent = False
+            field_range[record_id] = {
                 "id": record_id,
-                "display_name": record["display_name"],
-                # If the parent directory is not in all the records we should not
-                # set parent_id because the user does not have access to parent.
-                "parent_id": (
-                    parent[0] if parent and parent[0] in all_record_ids else False
-                ),
+                "display_name": name,
+                "parent_id": parent,
             }
-            if enable_counters:
-                record_values["__count"] = 0
-            field_range[record_id] = record_values
-        if enable_counters:
-            res = super().search_panel_select_range(field_name, **kwargs)
-            for item in res["values"]:
-                if item["id"] in field_range:
-                    field_range[item["id"]]["__count"] = item["__count"]
+        if kwargs.get("enable_counters"):
+            groups = self._read_group(
+                domain=expression.AND(
+                    [
+                        kwargs.get("search_domain", []),
+                        kwargs.get("category_domain", []),
+                        kwargs.get("filter_domain", []),
+                        [("directory_id", "in", list(field_range))],
+                    ]
+                ),
+                groupby=["directory_id"],
+                aggregates=["__count"],
+            )
+            counts = {directory.id: count for directory, count in groups}
+            for record_id, record_values in field_range.items():
+                record_values["__count"] = counts.get(record_id, 0)
         return {"parent_field": "parent_id", "values": list(field_range.values())}
 
+    @api.model
+    def _get_directory_path_ids(self, directory_id):
+        """Get the directories of the files under a directory, along with all
+        their parent directories, from their parent paths.
+
+        :param int directory_id: The directory containing the files.
+        :return: The ids of the directories.
+        :rtype: list
+        """
+        self.flush_model(["directory_id"])
+        self.env["dms.directory"].flush_model(["parent_path"])
+        files = self._search([("directory_id", "child_of", directory_id)])
+        self.env.cr.execute(
+            SQL(
+                """
+                SELECT DISTINCT path.id::int
+                FROM dms_directory AS d,
+                    unnest(string_to_array(rtrim(d.parent_path, '/'), '/')) AS path(id)
+                WHERE d.id IN (SELECT directory_id FROM dms_file WHERE id IN (%s))
+                """,
+                files.subselect(),
+            )
+        )
+        return [row[0] for row in self.env.cr.fetchall()]
+
     @api.model
     def search_panel_select_multi_range(self, field_name, **kwargs):
         operator, directory_id = self._search_panel_directory(**kwargs)
         if field_name == "tag_ids":
-            sql_query = """
-                SELECT t.name AS name, t.id AS id, c.name AS group_name,
-                    c.id AS group_id, COUNT(r.fid) AS count
-                FROM dms_tag t
-                JOIN dms_category c ON t.category_id = c.id
-                LEFT JOIN dms_file_tag_rel r ON t.id = r.tid
-                WHERE %(filter_by_file_ids)s IS FALSE OR r.fid = ANY(%(file_ids)s)
-                GROUP BY c.name, c.id, t.name, t.id
-                ORDER BY c.name, c.id, t.name, t.id;
-            """
-            file_ids = []
-            if directory_id:
-                file_ids = self.search([("directory_id", operator, directory_id)]).ids
+            # The files are counted through a subquery applying the access
+            # rules and the current search
+            self.env["dms.tag"].flush_model(["name", "category_id"])
+            self.env["dms.category"].flush_model(["name"])
+            self.flush_model(["tag_ids"])
             self.env.cr.execute(
-                sql_query,
-                {"file_ids": file_ids, "filter_by_file_ids": bool(directory_id)},
+                SQL(
+                    """
+                    SELECT t.name AS name, t.id AS id, c.name AS group_name,
+                        c.id AS group_id, COUNT(r.fid) AS count
+                    FROM dms_tag t
+                    JOIN dms_category c ON t.category_id = c.id
+                    LEFT JOIN dms_file_tag_rel r
+                        ON t.id = r.tid AND r.fid IN (%s)
+                    GROUP BY c.name, c.id, t.name, t.id
+                    ORDER BY c.name, c.id, t.name, t.id
+                    """,
+                    self._search_panel_files(**kwargs).subselect(),
+                )
             )
             return self.env.cr.dictfetchall()
         if directory_id and field_name in ["directory_id", "category_id"]:
@@ -398,30 +663,41 @@ class DMSFile(models.Model):
         ).search_panel_select_multi_range(field_name, **kwargs)
 
     # Read
-    @api.depends("name", "directory_id", "directory_id.parent_path")
+    @api.depends("name", "directory_id")
     def _compute_path(self):
         model = self.env["dms.directory"]
+        paths = {
+            directory: [int(item) for item in directory.parent_path.split("/")[:-1]]
+            for directory in self.directory_id
+            if directory.parent_path
+        }
+        prefetch_ids = {item for path in paths.values() for item in path}
         for record in self:
-            path_names = [record.display_name]
+            directory = record.directory_id
+            if directory in paths:
+                directories = model.browse(paths[directory]).with_prefetch(prefetch_ids)
+            else:
+                # Unsaved directories have no parent path yet
+                directories = model
+                while directory:
+                    directories = directory | directories
+                    directory = directory.parent_id
+            path_names = directories.mapped("name") + [record.display_name]
             path_json = [
+                {
+                    "model": model._name,
+                    "name": directory.name,
+                    "id": directory._origin.id,
+                }
+                for directory in directories
+            ]
+            path_json.append(
                 {
                     "model": record._name,
                     "name": record.display_name,
                     "id": isinstance(record.id, int) and record.id or 0,
                 }
-            ]
-            current_dir = record.directory_id
-            while current_dir:
-                path_names.insert(0, current_dir.name)
-                path_json.insert(
-                    0,
-                    {
-                        "model": model._name,
-                        "name": current_dir.name,
-                        "id": current_dir._origin.id,
-                    },
-                )
-                current_dir = current_dir.parent_id
+            )
             record.update(
                 {
                     "path_names": "/".join(path_names) if all(path_names) else "",
@@ -429,55 +705,93 @@ class DMSFile(models.Model):
                 }
             )
 
-    @api.depends("name", "mimetype", "content")
+    @api.depends("name", "mimetype")
     def _compute_extension(self):
         for record in self:
-            record.extension = file.guess_extension(
-                record.name, record.mimetype, record.content
-            )
+            record.extension = file.guess_extension(record.name, record.mimetype)
 
-    @api.depends("content")
+    @api.depends("name", "checksum", "attachment_id")
     def _compute_mimetype(self):
         for record in self:
-            binary = base64.b64decode(record.content or "")
-            record.mimetype = guess_mimetype(binary)
+            record.mimetype = file.guess_file_type(
+                record.name, record._get_content_header()
+            )[0]
+
+    def _get_content_header(self):
+        """Get the first bytes of the raw content, used to guess its type.
+
+        The content is neither decoded nor read from the filestore in full.
+
+        :return: The first ``HEADER_SIZE`` bytes of the content.
+        :rtype: bytes
+        """
+        self.ensure_one()
+        if not self._origin:
+            # Only the base64 encoded content is known for new records, the
+            # slice is a multiple of 4 characters to be decoded on its own
+            content = self.content or b""
+            return base64.b64decode(content[: -(-file.HEADER_SIZE // 3) * 4])
+        blob = self._origin.sudo().blob_id
+        if blob:
+            return blob._read(0, file.HEADER_SIZE)
+        stream = self._origin._get_content_stream()
+        if stream.type == "path":
+            with open(stream.path, "rb") as content_file:
+                return content_file.read(file.HEADER_SIZE)
+        return (stream.data or b"")[: file.HEADER_SIZE]
 
     @api.depends("size")
     def _compute_human_size(self):
         for item in self:
             item.human_size = human_size(item.size)
 
-    @api.depends("content_binary", "content_file", "attachment_id")
+    @api.depends("content_file", "attachment_id", "blob_id")
     def _compute_content(self):
         bin_size = self.env.context.get("bin_size", False)
+        if bin_size:
+            # Only the stored metadata is read, the content is never loaded
+            for record in self:
+                size = record.size
+                if not size and record.attachment_id:
+                    size = record.sudo().attachment_id.file_size
+                record.content = human_size(size) if size else False
+            return
         for record in self:
             if record.content_file:
-                context = {"human_size": True} if bin_size else {"base64": True}
-                record.content = record.with_context(**context).content_file
-            elif record.content_binary:
-                record.content = (
-                    record.content_binary
-                    if bin_size
-                    else base64.b64encode(record.content_binary)
-                )
+                record.content = record.with_context(base64=True).content_file
+            elif record.blob_id:
+                record.content = base64.b64encode(record.sudo().blob_id._read())
             elif record.attachment_id:
-                context = {"human_size": True} if bin_size else {"base64": True}
-                record.content = record.with_context(**context).attachment_id.datas
+                record.content = record.with_context(base64=True).attachment_id.datas
 
-    @api.depends("content_binary", "content_file")
+    @api.depends("blob_id", "content_file")
     def _compute_save_type(self):
+        """Files are saved in the filestore when they have a ``content_file``
+        attachment, the attachments are looked up without reading them."""
+        file_ids = set()
+        saved = self.filtered("id")
+        if saved.ids:
+            self.env["ir.attachment"].flush_model(["res_model", "res_field", "res_id"])
+            self.env.cr.execute(
+                """
+                SELECT res_id FROM ir_attachment
+                WHERE res_model = %s AND res_field = 'content_file' AND res_id IN %s
+                """,
+                (self._name, tuple(saved.ids)),
+            )
+            file_ids = {row[0] for row in self.env.cr.fetchall()}
         for record in self:
-            if record.content_file:
-                record.save_type = "file"
+            if record.id:
+                in_file = record.id in file_ids
             else:
-                record.save_type = "database"
+                in_file = bool(record.content_file)
+            record.save_type = "file" if in_file else "database"
 
-    @api.depends("storage_id", "storage_id.save_type")
+    @api.depends("storage_id", "save_type")
     def _compute_migration(self):
-        storage_model = self.env["dms.storage"]
-        save_field = storage_model._fields["save_type"]
-        values = save_field._description_selection(self.env)
-        selection = {value[0]: value[1] for value in values}
+        """Changes of the save type of the storages are applied to all their
+        files at once by ``dms.storage._update_file_migration``."""
+        selection = self.env["dms.storage"]._get_save_type_labels()
         for record in self:
             storage_type = record.storage_id.save_type
             if storage_type == "attachment" or storage_type == record.save_type:
@@ -509,16 +823,34 @@ class DMSFile(models.Model):
 
     @api.constrains("name")
     def _check_name(self):
+        rules = self._get_name_rules()
         for record in self:
-            if not file.check_name(record.name):
+            if not file.check_name(record.name, rules):
                 raise ValidationError(_("The file name is invalid."))
-            files = record.sudo().directory_id.file_ids
-            if files.filtered(
-                lambda file, record=record: file.name == record.name and file != record
-            ):
-                raise ValidationError(
-                    _("A file with the same name already exists in this directory.")
+        self.flush_model(["name", "directory_id", "active"])
+        self.env.cr.execute(
+            """
+            SELECT f.name
+            FROM dms_file AS f
+            JOIN (
+                SELECT DISTINCT directory_id, name FROM dms_file WHERE id IN %s
+            ) AS checked
+                ON checked.directory_id = f.directory_id AND checked.name = f.name
+            WHERE f.active OR f.id IN %s
+            GROUP BY f.directory_id, f.name
+            HAVING COUNT(*) > 1
+            """,
+            (tuple(self.ids), tuple(self.ids)),
+        )
+        names = [row[0] for row in self.env.cr.fetchall()]
+        if names:
+            raise ValidationError(
+                _(
+                    "A file with the same name already exists in this directory: "
+                    "%(names)s",
+                    names=", ".join(names),
                 )
+            )
 
     @api.constrains("extension")
     def _check_extension(self):
@@ -541,8 +873,15 @@ class DMSFile(models.Model):
     def _inverse_content(self):
         updates = defaultdict(set)
         for record in self:
-            values = self._get_content_inital_vals()
             binary = base64.b64decode(record.content or "")
+            if (
+                record.checksum
+                and record.checksum == self._get_checksum(binary)
+                and not record.require_migration
+            ):
+                # Unchanged content, nothing depending on it is recomputed
+                continue
+            values = self._get_content_inital_vals()
             values = record._update_content_vals(values, binary)
             updates[tools.frozendict(values)].add(record.id)
         for vals, ids in updates.items():
@@ -581,6 +920,97 @@ class DMSFile(models.Model):
             del res_vals["content"]
         return res_vals
 
+    @api.model
+    def _create_from_uploads(self, directory, uploads):
+        """Create files from uploaded contents.
+
+        Files named like an existing file of the directory, or like another
+        upload, get a suffix. All the files are created in a single batch. If
+        the batch fails, each file is created on its own so that an invalid
+        file does not prevent the others from being created.
+
+        :param directory: The directory of the new files.
+        :param list uploads: A list of ``(name, binary)`` tuples.
+        :return: A list of dicts with either the ``id`` or the ``error`` of
+            each file.
+        :rtype: list[dict]
+        """
+        if not directory.exists() or not directory.permission_create:
+            raise UserError(_("You must select a directory first"))
+        names = file.NameAllocator(
+            directory.sudo().file_ids.mapped("name"), escape_suffix=True
+        )
+        vals_list = [
+            {"name": names.allocate(name), "directory_id": directory.id}
+            for name, _binary in uploads
+        ]
+        binaries = [binary for _name, binary in uploads]
+        try:
+            with self.env.cr.savepoint():
+                files = self._create_from_binaries(vals_list, binaries)
+            return [{"id": record.id, "name": record.name} for record in files]
+        except UserError:
+            self.env.invalidate_all()
+        result = []
+        for vals, binary in zip(vals_list, binaries, strict=True):
+            try:
+                with self.env.cr.savepoint():
+                    record = self._create_from_binaries([vals], [binary])
+                result.append({"id": record.id, "name": record.name})
+            except UserError as error:
+                self.env.invalidate_all()
+                result.append({"name": vals["name"], "error": str(error)})
+        return result
+
+    @api.model
+    def _create_from_binaries(self, vals_list, binaries):
+        """Create files from raw contents in a single batch.
+
+        The contents saved in the database or in the filestore are written as
+        is, along with the values computed from them by ``_get_binary_vals``
+        like when they are written through ``content``, instead of being
+        encoded in base64 and decoded back. The contents of the other save
+        types are written through ``content``.
+
+        :param list vals_list: The values of the files, with a ``directory_id``.
+        :param list binaries: The raw content of each file.
+        :return: The new files.
+        :rtype: odoo.model.dms_file
+        """
+        directory_model = self.env["dms.directory"].sudo()
+        new_vals_list = []
+        filestore_contents = {}
+        for index, (vals, binary) in enumerate(zip(vals_list, binaries, strict=True)):
+            storage = directory_model.browse(vals["directory_id"]).storage_id
+            if storage.save_type not in ("database", "file") or not binary:
+                new_vals_list.append(dict(vals, content=base64.b64encode(binary)))
+                continue
+            mimetype, extension = file.guess_file_type(vals["name"], binary)
+            new_vals = dict(vals, mimetype=mimetype, extension=extension)
+            new_vals.update(self._get_binary_vals(storage, binary))
+            if storage.save_type == "file":
+                filestore_contents[index] = binary
+            new_vals_list.append(new_vals)
+        records = self.create(new_vals_list)
+        if filestore_contents:
+            files = records.browse([records[index].id for index in filestore_contents])
+            self.env["ir.attachment"].sudo().create(
+                [
+                    {
+                        "name": "content_file",
+                        "res_model": self._name,
+                        "res_field": "content_file",
+                        "res_id": records[index].id,
+                        "type": "binary",
+                        "raw": binary,
+                    }
+                    for index, binary in filestore_contents.items()
+                ]
+            )
+            files.invalidate_recordset(["content_file"])
+            files.modified(["content_file"])
+        return records
+
     def copy(self, default=None):
         self.ensure_one()
         default = dict(default or [])
@@ -590,9 +1020,24 @@ class DMSFile(models.Model):
                 default.get("directory_id", False)
             )
             names = directory.sudo().file_ids.mapped("name")
-        default.update({"name": file.unique_name(self.name, names, self.extension)})
+        allocator = file.NameAllocator(names, escape_suffix=bool(self.extension))
+        default.update({"name": allocator.allocate(self.name)})
         return super().copy(default)
 
+    def _get_directory_totals(self, sign=1):
+        """Get what the files add to the totals of their directories.
+
+        :param int sign: -1 to get what removing the files subtracts.
+        :return: The deltas to apply with ``dms.directory._update_totals``.
+        :rtype: dict
+        """
+        deltas = defaultdict(lambda: [0.0, 0, 0])
+        for record in self.sudo().filtered("active"):
+            delta = deltas[record.directory_id.id]
+            delta[0] += sign * record.size
+            delta[1] += sign
+        return deltas
+
     @api.model_create_multi
     def create(self, vals_list):
         new_vals_list = []
@@ -600,7 +1045,40 @@ class DMSFile(models.Model):
             if "attachment_id" not in vals:
                 vals = self._create_model_attachment(vals)
             new_vals_list.append(vals)
-        return super().create(new_vals_list)
+        # The content is written during the creation, the totals of the
+        # directories are only updated once the files are complete.
+        records = super(
+            DMSFile, self.with_context(dms_skip_directory_totals=True)
+        ).create(new_vals_list)
+        records = records.with_env(self.env)
+        self.env["dms.directory"]._update_totals(records._get_directory_totals())
+        return records
+
+    def write(self, vals):
+        blobs = self.sudo().blob_id if "blob_id" in vals else False
+        track_totals = not self.env.context.get("dms_skip_directory_totals") and any(
+            key in vals for key in ["directory_id", "size", "active"]
+        )
+        if track_totals:
+            deltas = self._get_directory_totals(sign=-1)
+        res = super().write(vals)
+        if track_totals:
+            for directory_id, delta in self._get_directory_totals().items():
+                deltas[directory_id] = [
+                    a + b for a, b in zip(deltas[directory_id], delta, strict=True)
+                ]
+            self.env["dms.directory"]._update_totals(deltas)
+        if blobs:
+            blobs._gc()
+        return res
+
+    def unlink(self):
+        blobs = self.sudo().blob_id
+        deltas = self._get_directory_totals(sign=-1)
+        res = super().unlink()
+        self.env["dms.directory"]._update_totals(deltas)
+        blobs._gc()
+        return res
 
     # ----------------------------------------------------------
     # Locking fields and functions
@@ -633,29 +1111,3 @@ class DMSFile(models.Model):
                 )
             else:
                 record.update({"is_locked": False, "is_lock_editor": False})
-
-    def get_attachment_object(self, attachment):
-        return {
-            "name": attachment.name,
-            "datas": attachment.datas,
-            "res_model": attachment.res_model,
-            "mimetype": attachment.mimetype,
-        }
-
-    @api.model
-    def get_dms_files_from_attachments(self, attachment_ids=None):
-        """Get the dms files from uploaded attachments.
-        :return: An Array of dms files.
-        """
-        if not attachment_ids:
-            raise UserError(_("No attachment was provided"))
-
-        attachments = self.env["ir.attachment"].browse(attachment_ids)
-
-        if any(
-            attachment.res_id or attachment.res_model != "dms.file"
-            for attachment in attachments
-        ):
-            raise UserError(_("Invalid attachments!"))
-
-        return [self.get_attachment_object(attachment) for attachment in attachments]
@@ -0,0 +1,142 @@
+# Copyright 2024 Subteno - Timothée Vannier (https://www.subteno.com).
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl).
+
+from odoo import api, fields, models
+
+
+class DmsFileBlob(models.Model):
+    """Content of the files saved in the database.
+
+    The contents are kept out of the ``dms_file`` table so that scanning and
+    sorting the files never goes through their bytes. With
+    ``deduplicate_content`` enabled, a blob is shared by all the files with
+    the same checksum, otherwise each file has its own. A blob is referenced
+    by its files and is garbage collected as soon as the last of them is
+    unlinked or migrated.
+    """
+
+    _name = "dms.file.blob"
+    _description = "File Content"
+    _rec_name = "checksum"
+
+    checksum = fields.Char(string="Checksum/SHA1", required=True, readonly=True)
+    content = fields.Binary(attachment=False, prefetch=False, readonly=True)
+    size = fields.Float(readonly=True)
+    shared = fields.Boolean(
+        readonly=True, help="Shared by all the files with the same checksum."
+    )
+    file_ids = fields.One2many(
+        comodel_name="dms.file",
+        inverse_name="blob_id",
+        string="Files",
+        readonly=True,
+    )
+    ref_count = fields.Integer(compute="_compute_ref_count", string="References")
+
+    def init(self):
+        # Only the shared blobs are unique per checksum
+        self.env.cr.execute(
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS dms_file_blob_shared_checksum_uniq
+            ON dms_file_blob (checksum) WHERE shared
+            """
+        )
+        # Uncompressed contents are sliced without reading them in full
+        self.env.cr.execute(
+            "ALTER TABLE dms_file_blob ALTER COLUMN content SET STORAGE EXTERNAL"
+        )
+
+    def _compute_ref_count(self):
+        groups = self.env["dms.file"]._read_group(
+            domain=[("blob_id", "in", self.ids)],
+            groupby=["blob_id"],
+            aggregates=["__count"],
+        )
+        counts = {blob.id: count for blob, count in groups}
+        for record in self:
+            record.ref_count = counts.get(record.id, 0)
+
+    @api.model
+    def _get_or_create(self, checksum, binary, shared=True):
+        """Get the blob storing the given content, creating it if needed.
+
+        The content of a shared blob is only sent to the database when no
+        blob with the same checksum exists yet.
+
+        :param str checksum: The SHA1 checksum of the content.
+        :param bytes binary: The raw content.
+        :param bool shared: Whether the blob is shared by the files with the
+            same checksum, or owned by a single file.
+        :return: The blob storing the content.
+        :rtype: odoo.model.dms_file_blob
+        """
+        query = "SELECT id FROM dms_file_blob WHERE checksum = %s AND shared"
+        row = None
+        if shared:
+            self.env.cr.execute(query, (checksum,))
+            row = self.env.cr.fetchone()
+        if not row:
+            self.env.cr.execute(
+                """
+                INSERT INTO dms_file_blob (
+                    checksum, content, size, shared,
+                    create_uid, create_date, write_uid, write_date
+                )
+                VALUES (%s, %s, %s, %s, %s, NOW() AT TIME ZONE 'UTC',
+                    %s, NOW() AT TIME ZONE 'UTC')
+                ON CONFLICT (checksum) WHERE shared DO NOTHING
+                RETURNING id
+                """,
+                (
+                    checksum,
+                    binary,
+                    len(binary),
+                    shared,
+                    self.env.uid,
+                    self.env.uid,
+                ),
+            )
+            row = self.env.cr.fetchone()
+            if not row:
+                # Created by a concurrent transaction in the meantime
+                self.env.cr.execute(query, (checksum,))
+                row = self.env.cr.fetchone()
+        return self.browse(row[0])
+
+    def _read(self, offset=0, length=None):
+        """Read a slice of the content without loading the rest of it.
+
+        :param int offset: The position of the first byte to read.
+        :param int length: The number of bytes to read, all the remaining
+            bytes by default.
+        :return: The bytes read.
+        :rtype: bytes
+        """
+        self.ensure_one()
+        self.flush_recordset(["content"])
+        self.env.cr.execute(
+            """
+            SELECT substring(content FROM %s FOR COALESCE(%s, octet_length(content)))
+            FROM dms_file_blob WHERE id = %s
+            """,
+            (offset + 1, length, self.id),
+        )
+        row = self.env.cr.fetchone()
+        return bytes(row[0] or b"") if row else b""
+
+    def _gc(self):
+        """Remove the blobs that are no longer referenced by any file."""
+        if not self:
+            return
+        self.env["dms.file"].flush_model(["blob_id"])
+        self.env.cr.execute(
+            """
+            DELETE FROM dms_file_blob AS blob
+            WHERE blob.id IN %s
+                AND NOT EXISTS (
+                    SELECT 1 FROM dms_file AS f WHERE f.blob_id = blob.id
+                )
+            """,
+            (tuple(self.ids),),
+        )
+        self.invalidate_recordset()
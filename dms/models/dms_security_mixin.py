@@ -8,11 +8,13 @@ from logging import getLogger
 
 from odoo import api, fields, models
 from odoo.osv.expression import (
+    AND,
     FALSE_DOMAIN,
     NEGATIVE_TERM_OPERATORS,
     OR,
     TRUE_DOMAIN,
 )
+from odoo.tools import SQL
 
 _logger = getLogger(__name__)
 
@@ -70,11 +72,11 @@ class DmsSecurityMixin(models.AbstractModel):
 
     def _compute_permissions(self):
         """
-        Get permissions for the current record.
-        """
+        Get permissions for the current records.
 
-        # Update according to presence when applying ir.rule
-        self.invalidate_recordset()
+        The record rules of the four operations are applied to the whole
+        recordset in a single query.
+        """
         if self.env.su:
             self.update(
                 {
@@ -86,23 +88,47 @@ class DmsSecurityMixin(models.AbstractModel):
             )
             return
 
-        creatable = self._filter_access_rules("create")
-        readable = self._filter_access_rules("read")
-        unlinkable = self._filter_access_rules("unlink")
-        writeable = self._filter_access_rules("write")
+        operations = ("create", "read", "unlink", "write")
+        ids = tuple(self._origin.ids)
+        allowed = {}
+        if ids:
+            column = SQL.identifier(self._table, "id")
+            model = self.sudo().with_context(active_test=False)
+            checks = []
+            for operation in operations:
+                domain = self.env["ir.rule"]._compute_domain(self._name, operation)
+                query = model._search(AND([[("id", "in", ids)], domain or []]))
+                checks.append(SQL("%s IN (%s)", column, query.subselect()))
+            self.env.cr.execute(
+                SQL(
+                    "SELECT %s, %s, %s, %s, %s FROM %s WHERE %s IN %s",
+                    column,
+                    *checks,
+                    SQL.identifier(self._table),
+                    column,
+                    ids,
+                )
+            )
+            allowed = {row[0]: row[1:] for row in self.env.cr.fetchall()}
         for one in self:
+            permissions = allowed.get(one._origin.id, (False,) * len(operations))
             one.update(
                 {
-                    "permission_create": bool(one & creatable),
-                    "permission_read": bool(one & readable),
-                    "permission_unlink": bool(one & unlinkable),
-                    "permission_write": bool(one & writeable),
+                    f"permission_{operation}": bool(permission)
+                    for operation, permission in zip(
+                        operations, permissions, strict=True
+                    )
                 }
             )
 
     @api.model
     def _get_domain_by_inheritance(self, operation):
-        """Get domain for inherited accessible records."""
+        """Get domain for inherited accessible records.
+
+        The accessible linked records are selected by a subquery on the table
+        of each linked model (applying its record rules), so that their ids
+        never need to be loaded.
+        """
         if self.env.su:
             return []
         inherited_access_field = "storage_id_inherit_access_from_parent_record"
@@ -113,15 +139,14 @@ class DmsSecurityMixin(models.AbstractModel):
             (inherited_access_field, "=", True),
         ]
         domains = []
-        # Get all used related records
-        related_groups = self.sudo().read_group(
+        # Get all used related models
+        related_groups = self.sudo()._read_group(
             domain=inherited_access_domain + [("res_model", "!=", False)],
-            fields=["res_id:array_agg"],
             groupby=["res_model"],
         )
-        for group in related_groups:
+        for (res_model,) in related_groups:
             try:
-                model = self.env[group["res_model"]]
+                model = self.env[res_model]
             except KeyError:
                 # The model might not be registered.
                 # This is normal if you are upgrading the database.
@@ -129,7 +154,7 @@ class DmsSecurityMixin(models.AbstractModel):
                 # These records will be accessible by DB users only.
                 domains.append(
                     [
-                        ("res_model", "=", group["res_model"]),
+                        ("res_model", "=", res_model),
                         (True, "=", self.env.user.has_group("base.group_user")),
                     ]
                 )
@@ -138,16 +163,14 @@ class DmsSecurityMixin(models.AbstractModel):
             if not model.check_access_rights(operation, raise_exception=False):
                 continue
             domains.append([("res_model", "=", model._name), ("res_id", "=", False)])
-            # Check record access in batch too
-            res_ids = [i for i in group["res_id"] if i]  # Hack to remove None res_id
-            # Apply exists to skip records that do not exist. (e.g. a res.partner
-            # deleted by database).
-            model_records = model.browse(res_ids).exists()
-            related_ok = model_records._filter_access_rules_python(operation)
-            if not related_ok:
-                continue
+            # Only existing records matching the rules of the linked model are
+            # selected by the subquery. The rules domain is cached per user.
+            rules_domain = self.env["ir.rule"]._compute_domain(model._name, operation)
+            related_query = (
+                model.sudo().with_context(active_test=False)._search(rules_domain or [])
+            )
             domains.append(
-                [("res_model", "=", model._name), ("res_id", "in", related_ok.ids)]
+                [("res_model", "=", model._name), ("res_id", "in", related_query)]
             )
         result = inherited_access_domain + OR(domains)
         return result
@@ -156,22 +179,19 @@ class DmsSecurityMixin(models.AbstractModel):
     def _get_access_groups_query(self, operation):
         """Return the query to select access groups."""
         operation_check = {
-            "create": "AND dag.perm_inclusive_create",
+            "create": "AND perm_create",
             "read": "",
-            "unlink": "AND dag.perm_inclusive_unlink",
-            "write": "AND dag.perm_inclusive_write",
+            "unlink": "AND perm_unlink",
+            "write": "AND perm_write",
         }[operation]
+        # Flattened by dms.directory, see its init()
         select = f"""
             SELECT
-                dir_group_rel.aid
+                directory_id
             FROM
-                dms_directory_complete_groups_rel AS dir_group_rel
-                INNER JOIN dms_access_group AS dag
-                    ON dir_group_rel.gid = dag.id
-                INNER JOIN dms_access_group_users_rel AS users
-                    ON users.gid = dag.id
+                dms_directory_access
             WHERE
-                users.uid = %s {operation_check}
+                user_id = %s {operation_check}
             """
         return select, (self.env.uid,)
 
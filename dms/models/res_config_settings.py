@@ -19,3 +19,24 @@ class ResConfigSettings(models.TransientModel):
         help="Defines a list of forbidden file extensions. (Example: 'exe,msi')",
         config_parameter="dms.forbidden_extensions",
     )
+
+    documents_name_rules = fields.Char(
+        string="Name Rules",
+        help="Defines a list of filesystems whose naming rules file and directory "
+        "names must follow. (Example: 'posix,windows')",
+        config_parameter="dms.name_rules",
+    )
+
+    documents_thumbnail_workers = fields.Integer(
+        string="Thumbnail Workers",
+        help="Defines the number of processes generating the thumbnails. "
+        "Default (0) generates them in the scheduled action itself.",
+        config_parameter="dms.thumbnail_workers",
+    )
+
+    documents_thumbnail_max_pixels = fields.Integer(
+        string="Thumbnail Max Pixels",
+        help="Defines the maximum number of pixels of the images thumbnails are "
+        "generated for. Default (50000000)",
+        config_parameter="dms.thumbnail_max_pixels",
+    )
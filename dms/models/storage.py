@@ -3,10 +3,13 @@
 # Copyright 2021 Tecnativa - Víctor Martínez
 # License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl).
 
+import json
 import logging
+import time
 
 from odoo import _, api, fields, models
 from odoo.exceptions import AccessError
+from odoo.tools import human_size
 
 _logger = logging.getLogger(__name__)
 
@@ -85,6 +88,24 @@ class Storage(models.Model):
         "composition process too",
     )
     model = fields.Char(search="_search_model", store=False)
+    deduplicate_content = fields.Boolean(
+        string="Deduplicate Contents",
+        default=False,
+        help="Files with the same content share a single copy of it. Only "
+        "applies to storages saving in the database, the filestore already "
+        "stores identical contents once. Existing files are deduplicated when "
+        "their content is written again.",
+    )
+    content_logical_size = fields.Float(
+        compute="_compute_content_sizes", string="Size of Files"
+    )
+    content_stored_size = fields.Float(
+        compute="_compute_content_sizes", string="Stored Size"
+    )
+    deduplication_ratio = fields.Float(
+        compute="_compute_content_sizes",
+        help="Size of the files divided by the size actually stored.",
+    )
 
     def _search_model(self, operator, value):
         allowed_items = self.env["ir.model"].sudo().search([("model", operator, value)])
@@ -101,14 +122,91 @@ class Storage(models.Model):
         if self.save_type != "attachment":
             if not self.env.user.has_group("dms.group_dms_manager"):
                 raise AccessError(_("Only managers can execute this action."))
-            files = self.env["dms.file"].with_context(active_test=False).sudo()
+            self._migrate_files()
+
+    def _migrate_files(self, batch_size=None, id_from=None, id_to=None, commit=False):
+        """Migrate the files requiring it to the save type of their storage.
+
+        The files are migrated by batches in the order of their ids. When
+        committing after each batch, an interrupted migration is resumed by
+        running it again, and the work can be split between several workers
+        with the ranges given by ``_get_migration_id_ranges``, e.g. from
+        ``odoo shell``::
+
+            storage._migrate_files(id_from=1, id_to=250000, commit=True)
+
+        :param int batch_size: The number of files migrated per batch, by
+            default the ``dms.migration_batch_size`` system parameter.
+        :param int id_from: The lowest id of the files to migrate.
+        :param int id_to: The highest id of the files to migrate.
+        :param bool commit: Whether to commit after each batch.
+        :return: The number of migrated files.
+        :rtype: int
+        """
+        batch_size = batch_size or int(
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("dms.migration_batch_size", default=500)
+        )
+        files = self.env["dms.file"].with_context(active_test=False).sudo()
+        domain = [
+            ("require_migration", "=", True),
+            ("storage_id", "in", self.ids),
+        ]
+        if id_from:
+            domain.append(("id", ">=", id_from))
+        if id_to:
+            domain.append(("id", "<=", id_to))
+        total = files.search_count(domain)
+        count = size = last_id = 0
+        start = time.monotonic()
+        while True:
+            batch = files.search(
+                domain + [("id", ">", last_id)], order="id", limit=batch_size
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+            batch._migrate_content()
+            count += len(batch)
+            size += sum(batch.mapped("size"))
+            if commit:
+                self.env.cr.commit()  # pylint: disable=invalid-commit
+                self.env.invalidate_all()
+            elapsed = max(time.monotonic() - start, 0.001)
+            _logger.info(
+                "Migrated %s of %s files (%.1f files/s, %s/s)",
+                count,
+                total,
+                count / elapsed,
+                human_size(size / elapsed),
+            )
+        return count
 
-            for record in self:
-                domain = [
-                    ("require_migration", "=", True),
-                    ("storage_id", "=", record.id),
-                ]
-                files.search(domain).action_migrate()
+    def _get_migration_id_ranges(self, parts):
+        """Split the files to migrate in id ranges of similar sizes.
+
+        :param int parts: The number of ranges, usually one per worker.
+        :return: A list of ``(id_from, id_to)`` tuples.
+        :rtype: list
+        """
+        self.env["dms.file"].flush_model(["require_migration", "directory_id"])
+        self.env["dms.directory"].flush_model(["storage_id"])
+        self.env.cr.execute(
+            """
+            SELECT MIN(id), MAX(id)
+            FROM (
+                SELECT f.id, ntile(%s) OVER (ORDER BY f.id) AS part
+                FROM dms_file AS f
+                JOIN dms_directory AS d ON d.id = f.directory_id
+                WHERE f.require_migration AND d.storage_id IN %s
+            ) AS files
+            GROUP BY part
+            ORDER BY part
+            """,
+            (parts, tuple(self.ids)),
+        )
+        return self.env.cr.fetchall()
 
     def action_save_onboarding_storage_step(self):
         self.env.user.company_id.set_onboarding_step_done(
@@ -126,8 +224,94 @@ class Storage(models.Model):
         for record in self:
             record.count_storage_files = len(record.storage_file_ids)
 
+    def _compute_content_sizes(self):
+        """Compare the size of the files with the size of the distinct contents.
+
+        Filestore contents are stored once per checksum, database contents
+        once per blob, which may be shared by the files with the same checksum.
+        """
+        sizes = {}
+        if self.ids:
+            self.env["dms.file"].flush_model(
+                ["storage_id", "size", "checksum", "blob_id"]
+            )
+            self.env.cr.execute(
+                """
+                SELECT storage_id, SUM(logical_size), SUM(stored_size)
+                FROM (
+                    SELECT
+                        storage_id,
+                        SUM(size) AS logical_size,
+                        MAX(size) AS stored_size
+                    FROM dms_file
+                    WHERE storage_id IN %s
+                    GROUP BY
+                        storage_id,
+                        CASE
+                            WHEN blob_id IS NOT NULL THEN 'blob-' || blob_id
+                            ELSE COALESCE(checksum, id::text)
+                        END
+                ) AS contents
+                GROUP BY storage_id
+                """,
+                (tuple(self.ids),),
+            )
+            sizes = {row[0]: row[1:] for row in self.env.cr.fetchall()}
+        for record in self:
+            logical_size, stored_size = sizes.get(record.id, (0.0, 0.0))
+            record.content_logical_size = logical_size
+            record.content_stored_size = stored_size
+            record.deduplication_ratio = (
+                logical_size / stored_size if stored_size else 1.0
+            )
+
+    @api.model
+    def _get_save_type_labels(self):
+        values = self._fields["save_type"]._description_selection(self.env)
+        return dict(values)
+
+    def _update_file_migration(self):
+        """Update the migration status of all the files of the storages.
+
+        The status is derived from the stored save types with a single query,
+        instead of being recomputed file by file.
+        """
+        if not self.ids:
+            return
+        files = self.env["dms.file"]
+        self.flush_recordset(["save_type"])
+        files.flush_model(["storage_id", "save_type", "migration", "require_migration"])
+        self.env.cr.execute(
+            """
+            UPDATE dms_file AS f
+            SET
+                require_migration = (
+                    s.save_type != 'attachment'
+                    AND f.save_type IS DISTINCT FROM s.save_type
+                ),
+                migration = CASE
+                    WHEN s.save_type = 'attachment' OR f.save_type = s.save_type
+                    THEN %(labels)s::jsonb ->> s.save_type
+                    ELSE concat(
+                        %(labels)s::jsonb ->> f.save_type,
+                        ' > ',
+                        %(labels)s::jsonb ->> s.save_type
+                    )
+                END
+            FROM dms_storage AS s
+            WHERE s.id = f.storage_id AND s.id IN %(ids)s
+            """,
+            {
+                "labels": json.dumps(self._get_save_type_labels()),
+                "ids": tuple(self.ids),
+            },
+        )
+        files.invalidate_model(["migration", "require_migration"])
+
     def write(self, values):
         res = super().write(values)
         if "model_ids" in values:
             self.env.registry.clear_cache()
+        if "save_type" in values:
+            self._update_file_migration()
         return res
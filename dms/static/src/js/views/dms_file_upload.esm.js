@@ -83,90 +83,60 @@ export function createFileUploadExtension() {
         },
 
         async onChangeFileInput() {
-            const params = {
-                csrf_token: odoo.csrf_token,
-                ufile: [...this.fileInput.el.files],
-                model: "dms.file",
-                id: 0,
-            };
-
-            const fileData = await this.http.post(
-                "/web/binary/upload_attachment",
-                params,
-                "text"
-            );
-            const attachments = JSON.parse(fileData);
-            if (attachments.error) {
-                throw new Error(attachments.error);
-            }
-
-            await this.onUpload(attachments);
-        },
-
-        async onUpload(attachments) {
-            const self = this;
-            const attachmentIds = attachments.map((a) => a.id);
-            const ctx = this.props.context;
             const controllerID = this.actionService.currentController.jsId;
-
-            if (!attachmentIds.length) {
-                this.notification.add(_t("An error occurred during the upload"));
+            const files = [...this.fileInput.el.files];
+            if (!files.length) {
                 return;
             }
 
-            // Search the correct directory_id value according to the domain
-            let directory_id = false;
-            if (this.props.domain) {
-                for (const domain_item of this.props.domain) {
-                    if (domain_item.length === 3) {
-                        if (
-                            domain_item[0] === "directory_id" &&
-                            ["=", "child_of"].includes(domain_item[1])
-                        ) {
-                            directory_id = domain_item[2];
-                        }
-                    }
-                }
-            }
-
+            const directory_id = this._getUploadDirectoryId();
             if (directory_id === false) {
-                self.actionService.restore(controllerID);
-                return self.notification.add(_t("You must select a directory first"), {
+                this.actionService.restore(controllerID);
+                return this.notification.add(_t("You must select a directory first"), {
                     type: "danger",
                 });
             }
 
-            const attachment_datas = await this.orm.call(
-                "dms.file",
-                "get_dms_files_from_attachments",
-                [],
-                {attachment_ids: attachmentIds}
-            );
-
-            const attachments_args = [];
-
-            attachment_datas.forEach((attachment_data) => {
-                attachments_args.push({
-                    name: attachment_data.name,
-                    content: attachment_data.datas,
-                    mimetype: attachment_data.mimetype,
-                    directory_id,
+            let results = [];
+            try {
+                results = await this.http.post(
+                    "/dms/file/upload",
+                    {
+                        csrf_token: odoo.csrf_token,
+                        ufile: files,
+                        directory_id,
+                        context: JSON.stringify(this.props.context || {}),
+                    },
+                    "json"
+                );
+            } catch {
+                this.notification.add(_t("An error occurred during the upload"), {
+                    type: "danger",
                 });
-            });
-
-            this.orm
-                .call("dms.file", "create", [attachments_args], {
-                    context: ctx,
-                })
-                .then(() => {
-                    self.actionService.restore(controllerID);
-                })
-                .catch((error) => {
-                    self.notification.add(error.data.message, {
+            }
+            for (const result of results) {
+                if (result.error) {
+                    this.notification.add(`${result.name}: ${result.error}`, {
                         type: "danger",
                     });
-                    self.actionService.restore(controllerID);
-                });
+                }
+            }
+            this.actionService.restore(controllerID);
+        },
+
+        _getUploadDirectoryId() {
+            // Search the correct directory_id value according to the domain
+            let directory_id = false;
+            for (const domain_item of this.props.domain || []) {
+                if (
+                    domain_item.length === 3 &&
+                    domain_item[0] === "directory_id" &&
+                    ["=", "child_of"].includes(domain_item[1])
+                ) {
+                    directory_id = domain_item[2];
+                }
+            }
+            return directory_id;
         },
     };
 }
@@ -5,3 +5,4 @@ from . import test_file_database
 from . import test_file
 from . import test_benchmark
 from . import test_portal
+from . import test_upload
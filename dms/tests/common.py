@@ -5,11 +5,14 @@
 # License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl).
 import base64
 import functools
+import io
 import logging
 import threading
 import time
 import uuid
 
+from PIL import Image
+
 from odoo.tests import Form, new_test_user
 
 from odoo.addons.base.tests.common import BaseCommon
@@ -115,6 +118,12 @@ class DocumentsBaseCase(BaseCommon):
     def content_base64(cls):
         return base64.b64encode(b"\xff data")
 
+    @classmethod
+    def image_base64(cls, size=(16, 16)):
+        with io.BytesIO() as stream:
+            Image.new("RGB", size).save(stream, format="PNG")
+            return base64.b64encode(stream.getvalue())
+
     @classmethod
     def create_storage(cls, save_type="database"):
         return cls.storage_model.create(
@@ -3,9 +3,13 @@
 # Copyright 2024 Subteno - Timothée Vannier (https://www.subteno.com).
 # License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl).
 
+import base64
+import copy
+import email
 import logging
 import os
 import unittest
+import uuid
 
 from odoo.tests import common, tagged
 from odoo.tools import convert_file
@@ -14,6 +18,7 @@ from odoo.tools.misc import profile
 from .common import track_function
 
 _logger = logging.getLogger(__name__)
+_path = os.path.dirname(os.path.dirname(__file__))
 
 
 # This tests will only be executed if --test-tags benchmark is defined
@@ -357,6 +362,213 @@ class BenchmarkTestCase(common.TransactionCase):
         info_message += "\nLegend: Queries | Query Time | Server Time | Total Time\n"
         _logger.info(info_message)
 
+    def _setup_access_benchmark_data(
+        self, directory_count=10000, user_count=2000, group_count=20
+    ):
+        """Create a tree of directories shared with many users.
+
+        Each access group gets its own share of the users and of the second
+        level directories, which inherit them from their root directory.
+        """
+        storage = self.env["dms.storage"].create(
+            {"name": "Access Benchmark", "save_type": "database"}
+        )
+        users = (
+            self.env["res.users"]
+            .with_context(no_reset_password=True, mail_create_nolog=True)
+            .create(
+                [
+                    {
+                        "name": "DMS Benchmark %s" % index,
+                        "login": "dms-benchmark-%s" % index,
+                        "groups_id": [(4, self.ref("dms.group_dms_user"))],
+                    }
+                    for index in range(user_count)
+                ]
+            )
+        )
+        access_groups = self.env["dms.access.group"].create(
+            [
+                {
+                    "name": "DMS Benchmark %s" % index,
+                    "perm_write": bool(index % 2),
+                    "explicit_user_ids": [(6, 0, users[index::group_count].ids)],
+                }
+                for index in range(group_count)
+            ]
+        )
+        roots = self.env["dms.directory"].create(
+            [
+                {
+                    "name": "Benchmark %s" % index,
+                    "is_root_directory": True,
+                    "storage_id": storage.id,
+                    "group_ids": [(6, 0, access_groups[index % group_count].ids)],
+                }
+                for index in range(directory_count // 100)
+            ]
+        )
+        self.env["dms.directory"].create(
+            [
+                {"name": "Benchmark %s" % index, "parent_id": root.id}
+                for root in roots
+                for index in range(99)
+            ]
+        )
+        self.env.flush_all()
+        return users
+
+    def test_directory_access_benchmark(self):
+        users = self._setup_access_benchmark_data()
+        fields = ["name", "permission_write", "permission_unlink"]
+
+        def test_function(model, limit):
+            model.search_count([])
+            model.search_read([], fields, limit=limit)
+
+        benchmark_data = [
+            ["User %s" % user.id]
+            + self._benchmark_function(
+                test_function,
+                [
+                    [[self.env["dms.directory"].with_user(user), limit]]
+                    for limit in [1, 80, 500, None]
+                ],
+            )
+            for user in users[:3]
+        ]
+
+        info_message = "\n\nCounting and reading directories as a DMS user | "
+        info_message += "Benchmark with Limit 1 / 80 / 500 / None\n\n"
+        info_message += self._benchmark_table(
+            [
+                [
+                    "User",
+                    "Search Limit 1",
+                    "Search Limit 80",
+                    "Search Limit 500",
+                    "Search No Limit",
+                ]
+            ]
+            + benchmark_data
+        )
+        info_message += "\nLegend: Queries | Query Time | Server Time | Total Time || "
+        info_message += "10000 Directories | 2000 Users | 20 Access Groups\n"
+        _logger.info(info_message)
+
+    # ----------------------------------------------------------
+    # Mail
+    # ----------------------------------------------------------
+
+    def _mail_with_attachments(self, count):
+        """Scale up ``mail01.eml`` to the given number of attachments."""
+        with open(os.path.join(_path, "tests", "data", "mail01.eml")) as file:
+            message = email.message_from_string(file.read())
+        attachments = [part for part in message.walk() if part.get_filename()]
+        for index in range(count - len(attachments)):
+            message.attach(copy.deepcopy(attachments[index % len(attachments)]))
+        del message["Message-Id"]
+        message["Message-Id"] = "<dms-benchmark-%s@dmsTest.com>" % uuid.uuid4().hex
+        return message.as_string()
+
+    def test_mail_alias_files_benchmark(self):
+        storage = self.env["dms.storage"].create(
+            {"name": "Mail Benchmark", "save_type": "database"}
+        )
+        self.env["dms.directory"].create(
+            {
+                "name": "Mail Benchmark",
+                "is_root_directory": True,
+                "storage_id": storage.id,
+                "alias_process": "files",
+                "alias_name": "directory+test",
+            }
+        )
+
+        def test_function(message):
+            self.env["mail.thread"].message_process(None, message)
+
+        counts = [10, 100, 500]
+        benchmark_data = ["Super"] + self._benchmark_function(
+            test_function,
+            [[[self._mail_with_attachments(count)]] for count in counts],
+        )
+
+        info_message = "\n\nReceiving a mail with attachments on a directory alias | "
+        info_message += "Benchmark with 10 / 100 / 500 Attachments\n\n"
+        info_message += self._benchmark_table(
+            [
+                [
+                    "User",
+                    "10 Attachments",
+                    "100 Attachments",
+                    "500 Attachments",
+                ],
+                benchmark_data,
+            ]
+        )
+        info_message += "\nLegend: Queries | Query Time | Server Time | Total Time\n"
+        _logger.info(info_message)
+
+    # ----------------------------------------------------------
+    # Portal
+    # ----------------------------------------------------------
+
+    def _setup_portal_benchmark_data(self, depth=20, file_count=1000):
+        """Create a shared chain of directories, with the files spread on its
+        levels as they are listed in the portal."""
+        storage = self.env["dms.storage"].create(
+            {"name": "Portal Benchmark", "save_type": "database"}
+        )
+        directory = root = self.env["dms.directory"].create(
+            {
+                "name": "Portal Benchmark",
+                "is_root_directory": True,
+                "storage_id": storage.id,
+            }
+        )
+        directories = root
+        for index in range(depth - 1):
+            directory = self.env["dms.directory"].create(
+                {"name": "Portal Benchmark %s" % index, "parent_id": directory.id}
+            )
+            directories |= directory
+        files = self.env["dms.file"].create(
+            [
+                {
+                    "name": "Portal Benchmark %s.txt" % index,
+                    "directory_id": directories[index % depth].id,
+                    "content": base64.b64encode(b"Portal Benchmark %d" % index),
+                }
+                for index in range(file_count)
+            ]
+        )
+        root._portal_ensure_token()
+        self.env.flush_all()
+        return root.access_token, files
+
+    def test_portal_icon_benchmark(self):
+        access_token, files = self._setup_portal_benchmark_data()
+        files = files.with_user(self.env.ref("base.public_user"))
+        ir_binary = self.env["ir.binary"]
+
+        def test_function(files):
+            for record in files:
+                ir_binary._find_record_check_access(record, access_token)
+
+        benchmark_data = ["Public"] + self._benchmark_function(
+            test_function, [[[files[:limit]]] for limit in [80, 500, None]]
+        )
+
+        info_message = "\n\nChecking the access token of the files of a shared "
+        info_message += "directory | Benchmark with 80 / 500 / 1000 Files\n\n"
+        info_message += self._benchmark_table(
+            [["User", "80 Files", "500 Files", "1000 Files"], benchmark_data]
+        )
+        info_message += "\nLegend: Queries | Query Time | Server Time | Total Time || "
+        info_message += "20 Directory Levels\n"
+        _logger.info(info_message)
+
     # ----------------------------------------------------------
     # Profiler
     # ----------------------------------------------------------
@@ -4,9 +4,11 @@
 # Copyright 2024 Subteno - Timothée Vannier (https://www.subteno.com).
 # License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl).
 
+import base64
+import json
 import os
 
-from odoo.exceptions import UserError
+from odoo.exceptions import UserError, ValidationError
 from odoo.tests.common import users
 from odoo.tools import mute_logger
 
@@ -94,6 +96,35 @@ class DirectoryTestCaseBase(StorageDatabaseBaseCase):
             msg="The path name of the subdirectory should have changed",
         )
 
+    @users("dms-manager", "dms-user")
+    def test_file_paths(self):
+        root_directory = self.create_directory(storage=self.storage)
+        sub_directory = self.create_directory(directory=root_directory)
+        file = self.create_file(directory=sub_directory)
+        self.assertEqual(
+            file.path_names,
+            f"{root_directory.name}/{sub_directory.name}/{file.name}",
+        )
+        root_directory.name = "Renamed %s" % self.env.user.login
+        self.assertEqual(
+            file.path_names,
+            f"{root_directory.name}/{sub_directory.name}/{file.name}",
+            msg="The path of the file should follow the renamed directory",
+        )
+        self.assertEqual(
+            [item["id"] for item in json.loads(file.path_json)],
+            [root_directory.id, sub_directory.id, file.id],
+        )
+        sub_directory.parent_id = self.directory
+        self.assertEqual(
+            file.path_names,
+            f"{self.directory.name}/{sub_directory.name}/{file.name}",
+            msg="The path of the file should follow the moved directory",
+        )
+        self.assertEqual(
+            self.file_model.search([("path_names", "=", file.path_names)]), file
+        )
+
     @users("dms-manager", "dms-user")
     def test_move_directory(self):
         with self.assertRaises(UserError, msg="The root directory should not be moved"):
@@ -138,6 +169,51 @@ class DirectoryTestCaseBase(StorageDatabaseBaseCase):
                 }
             )
 
+    @users("dms-manager", "dms-user")
+    def test_get_own_root_directories(self):
+        root_ids = self.directory_model._get_own_root_directories()
+        self.assertIn(self.directory.id, root_ids)
+        self.assertNotIn(self.subdirectory.id, root_ids, msg="Its parent is accessible")
+        self.assertEqual(
+            self.directory_model._get_own_root_directories(count=True), len(root_ids)
+        )
+
+    @users("dms-manager")
+    def test_check_access_token(self):
+        self.directory._portal_ensure_token()
+        token = self.directory.access_token
+        self.assertTrue(self.directory.check_access_token(token))
+        self.assertTrue(self.subdirectory.check_access_token(token))
+        self.assertTrue(self.file.check_access_token(token))
+        self.assertFalse(self.subdirectory.check_access_token("abc-def"))
+        self.assertFalse(self.file_model.check_access_token(token))
+        self.subdirectory._portal_ensure_token()
+        self.assertFalse(
+            self.directory.check_access_token(self.subdirectory.access_token),
+            msg="The parent directory is not shared by the token",
+        )
+        new_directory = self.create_directory(storage=self.storage)
+        self.assertFalse(new_directory.check_access_token(token))
+        self.subdirectory.parent_id = new_directory
+        self.assertFalse(
+            self.file.check_access_token(token),
+            msg="The file is no longer under the shared directory",
+        )
+
+    @users("dms-manager", "dms-user")
+    def test_unique_names(self):
+        root_directory = self.create_directory(storage=self.storage)
+        sub_directory = self.create_directory(directory=root_directory)
+        with self.assertRaisesRegex(ValidationError, sub_directory.name):
+            self.create_directory(directory=root_directory).name = sub_directory.name
+        self.create_directory(directory=sub_directory).name = sub_directory.name
+        file = self.create_file(directory=sub_directory)
+        other_file = self.create_file(directory=sub_directory)
+        with self.assertRaisesRegex(ValidationError, file.name):
+            other_file.name = file.name
+        file.active = False
+        other_file.name = file.name
+
     @users("dms-manager", "dms-user")
     @mute_logger("odoo.models.unlink")
     def test_unlink_root_directory(self):
@@ -238,6 +314,132 @@ class DirectoryTestCaseBase(StorageDatabaseBaseCase):
     def test_size(self):
         self.assertTrue(self.directory.size, msg="The directory should have a size")
 
+    def _get_totals(self, directory):
+        directory = directory.sudo()
+        return (directory.total_directories, directory.total_files, directory.size)
+
+    @users("dms-manager", "dms-user")
+    def test_totals(self):
+        root_directory = self.create_directory(storage=self.storage)
+        sub_directory = self.create_directory(directory=root_directory)
+        file = self.create_file(directory=sub_directory)
+        self.assertEqual(self._get_totals(root_directory), (1, 1, file.size))
+        file.active = False
+        self.assertEqual(
+            self._get_totals(root_directory)[1],
+            0,
+            msg="Archived files should not be counted",
+        )
+        file.active = True
+        totals = self._get_totals(self.directory)
+        sub_directory.parent_id = self.directory
+        self.assertEqual(self._get_totals(root_directory), (0, 0, 0))
+        self.assertEqual(
+            self._get_totals(self.directory),
+            (totals[0] + 1, totals[1] + 1, totals[2] + file.size),
+            msg="The totals should follow the moved directory",
+        )
+        file.unlink()
+        self.assertEqual(self._get_totals(self.directory)[1], totals[1])
+        self.directory_model.sudo()._rebuild_totals()
+        self.assertEqual(
+            self._get_totals(self.directory),
+            (totals[0] + 1, totals[1], totals[2]),
+            msg="Rebuilding the totals should not change them",
+        )
+
+    @users("dms-manager", "dms-user")
+    def test_copy_directory_totals(self):
+        root_directory = self.create_directory(storage=self.storage)
+        sub_directory = self.create_directory(directory=root_directory)
+        nested_directory = self.create_directory(directory=sub_directory)
+        file_01 = self.create_file(directory=sub_directory)
+        file_02 = self.create_file(directory=nested_directory)
+        copy_sub_directory = sub_directory.copy()
+        self.assertEqual(
+            self._get_totals(copy_sub_directory),
+            (1, 2, file_01.size + file_02.size),
+            msg="The copied directory should have the totals of the original one",
+        )
+        self.assertEqual(
+            self._get_totals(root_directory),
+            (4, 4, 2 * (file_01.size + file_02.size)),
+            msg="The copied contents should be counted once in the parent",
+        )
+
+    def test_count_total_access(self):
+        root_directory = self.create_directory(storage=self.storage)
+        sub_directory = self.create_directory(directory=root_directory)
+        self.create_file(directory=root_directory)
+        self.create_file(directory=sub_directory)
+        sub_directory.inherit_group_ids = False
+        self.assertEqual(self._get_totals(root_directory)[:2], (1, 2))
+        root_directory = root_directory.with_user(self.dms_user)
+        self.assertEqual(
+            (root_directory.count_total_directories, root_directory.count_total_files),
+            (0, 1),
+            msg="Only the records the user can access should be counted",
+        )
+
+    def test_complete_groups(self):
+        root_directory = self.create_directory(storage=self.storage)
+        sub_directory = self.create_directory(directory=root_directory)
+        sub_sub_directory = self.create_directory(directory=sub_directory)
+        group = self.access_group_model.create({"name": "Other"})
+        root_directory.group_ids |= group
+        self.assertIn(
+            group,
+            sub_sub_directory.complete_group_ids,
+            msg="Groups should be propagated to the whole subtree",
+        )
+        sub_directory.inherit_group_ids = False
+        self.assertEqual(
+            sub_sub_directory.complete_group_ids,
+            sub_directory.group_ids,
+            msg="Groups should not be inherited above a non-inheriting directory",
+        )
+        sub_directory.inherit_group_ids = True
+        group.directory_ids -= root_directory
+        self.assertNotIn(group, sub_sub_directory.complete_group_ids)
+        self.env["ir.config_parameter"].set_param(
+            "dms.complete_groups_defer_threshold", 1
+        )
+        root_directory.group_ids |= group
+        self.assertTrue(root_directory.complete_groups_pending)
+        self.assertNotIn(group, sub_sub_directory.complete_group_ids)
+        self.directory_model._cron_propagate_complete_groups()
+        self.assertFalse(root_directory.complete_groups_pending)
+        self.assertIn(group, sub_sub_directory.complete_group_ids)
+
+    def test_complete_groups_deferred_removal(self):
+        root_directory = self.create_directory(storage=self.storage)
+        sub_directory = self.create_directory(directory=root_directory)
+        sub_sub_directory = self.create_directory(directory=sub_directory)
+        group = self.access_group_model.create(
+            {"name": "Other", "explicit_user_ids": [(6, 0, [self.dms_user.id])]}
+        )
+        root_directory.group_ids |= group
+        self.env["ir.config_parameter"].set_param(
+            "dms.complete_groups_defer_threshold", 1
+        )
+        root_directory.group_ids -= group
+        self.assertNotIn(
+            group,
+            sub_sub_directory.complete_group_ids,
+            msg="Removed groups should be propagated without waiting for the cron",
+        )
+        self.env.flush_all()
+        self.env.cr.execute(
+            """
+            SELECT 1 FROM dms_directory_access
+            WHERE user_id = %s AND directory_id = %s
+            """,
+            (self.dms_user.id, sub_sub_directory.id),
+        )
+        self.assertFalse(
+            self.env.cr.fetchall(), msg="The revoked access should be removed"
+        )
+
     @users("dms-manager", "dms-user")
     def test_name_get(self):
         directory = self.subdirectory.with_context(dms_directory_show_path=True)
@@ -266,6 +468,29 @@ class DirectoryTestCaseBase(StorageDatabaseBaseCase):
             msg="The tag_ids field should be a multi range field",
         )
 
+    @users("dms-manager", "dms-user")
+    def test_file_search_panel(self):
+        file_model = self.file_model.with_context(
+            active_model="dms.directory", active_id=self.directory.id
+        )
+        res = file_model.search_panel_select_range("directory_id", enable_counters=True)
+        values = {value["id"]: value for value in res["values"]}
+        self.assertEqual(set(values), {self.directory.id, self.subdirectory.id})
+        self.assertEqual(values[self.subdirectory.id]["parent_id"], self.directory.id)
+        self.assertEqual(values[self.subdirectory.id]["__count"], 1)
+        self.assertEqual(values[self.directory.id]["__count"], 0)
+        res = file_model.search_panel_select_range(
+            "directory_id",
+            enable_counters=True,
+            filter_domain=[("name", "=", "unknown")],
+        )
+        values = {value["id"]: value for value in res["values"]}
+        self.assertEqual(
+            values[self.subdirectory.id]["__count"],
+            0,
+            msg="The counters should follow the selected filters",
+        )
+
 
 class DirectoryMailTestCase(StorageDatabaseBaseCase):
     @classmethod
@@ -287,6 +512,10 @@ class DirectoryMailTestCase(StorageDatabaseBaseCase):
     def test_mail_alias_files(self):
         self.directory.write({"alias_process": "files", "alias_name": "directory+test"})
         self._handle_mail_reception()
+        file = self.directory.file_ids.filtered(lambda f: f.name == "attachment.txt")
+        self.assertTrue(file, msg="Mail attachments should be saved as files")
+        self.assertEqual(file.size, len(base64.b64decode(file.content)))
+        self.assertEqual(file.mimetype, "text/plain")
 
     def _handle_mail_reception(self):
         with open(os.path.join(_path, "tests", "data", "mail01.eml")) as file:
@@ -105,6 +105,48 @@ class FileFilestoreTestCase(StorageFileBaseCase):
             msg="User A should see sub_directory_x",
         )
 
+    @users("user-a")
+    def test_file_permissions(self):
+        files = (self.file2 | self.inaccessible_file).with_user(self.env.user)
+        self.assertEqual(
+            files.mapped("permission_read"),
+            [True, False],
+            msg="User A should only read the file of its directory",
+        )
+        self.assertEqual(
+            files.mapped("permission_create"),
+            [True, False],
+            msg="User A should only create in the directory of its group",
+        )
+        self.assertFalse(
+            any(files.mapped("permission_write")),
+            msg="User A should not write any file",
+        )
+        self.assertFalse(
+            any(files.mapped("permission_unlink")),
+            msg="User A should not unlink any file",
+        )
+
+    def test_directory_access_table(self):
+        query = """
+            SELECT perm_create, perm_write
+            FROM dms_directory_access
+            WHERE user_id = %s AND directory_id = %s
+        """
+        self.env.flush_all()
+        self.env.cr.execute(query, (self.user_a.id, self.sub_directory_x.id))
+        self.assertEqual(self.env.cr.fetchall(), [(True, False)])
+        self.group_a.perm_write = True
+        self.env.flush_all()
+        self.env.cr.execute(query, (self.user_a.id, self.sub_directory_x.id))
+        self.assertEqual(self.env.cr.fetchall(), [(True, True)])
+        self.group_a.explicit_user_ids = [(3, self.user_a.id)]
+        self.env.flush_all()
+        self.env.cr.execute(query, (self.user_a.id, self.sub_directory_x.id))
+        self.assertEqual(
+            self.env.cr.fetchall(), [], msg="User A should have lost its access"
+        )
+
     @users("dms-manager", "dms-user")
     @mute_logger("odoo.models.unlink")
     def test_content_file(self):
@@ -144,6 +186,23 @@ class FileFilestoreTestCase(StorageFileBaseCase):
         self.assertTrue(object_file.export_data(["content"]))
         object_file.unlink()
 
+    @users("dms-manager", "dms-user")
+    def test_content_file_bin_size(self):
+        object_file = self.create_file(directory=self.directory)
+        object_file.invalidate_recordset()
+        files = object_file.with_context(bin_size=True)
+        self.assertEqual(files.content, object_file.human_size)
+        self.assertEqual(files.save_type, "file")
+        self.assertFalse(
+            self.env.cache.contains(object_file, object_file._fields["content_file"]),
+            msg="The attachment is not read",
+        )
+        self.assertEqual(
+            files.read(["content"])[0]["content"],
+            object_file.human_size,
+            msg="The size is read without the content",
+        )
+
     def test_content_file_mimetype(self):
         file_svg = self.env.ref("dms.file_05_demo")
         self.assertEqual(file_svg.mimetype, "image/svg+xml", msg="SVG mimetype")
@@ -3,7 +3,11 @@
 # Copyright 2021-2022 Tecnativa - Víctor Martínez
 # License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl).
 
-from odoo.exceptions import UserError
+import base64
+import io
+import zipfile
+
+from odoo.exceptions import UserError, ValidationError
 from odoo.tests.common import users
 from odoo.tools import mute_logger
 
@@ -30,6 +34,50 @@ class FileDatabaseTestCase(StorageDatabaseBaseCase):
             sub_directory.count_files, 1, "Subdirectory total files should be 1"
         )
 
+    @users("dms-manager", "dms-user")
+    def test_create_from_uploads(self):
+        result = self.file_model._create_from_uploads(
+            self.directory2, [("upload.txt", b"upload"), ("upload2.txt", b"upload")]
+        )
+        files = self.file_model.browse([item["id"] for item in result])
+        self.assertEqual(len(files), 2, "Two files should be created")
+        self.assertEqual(files.directory_id, self.directory2)
+        self.assertEqual(files[0].size, 6, "Size should be the raw content size")
+
+    @users("dms-manager", "dms-user")
+    def test_create_from_uploads_defaults(self):
+        category = self.category_model.create({"name": "Category"})
+        tag = self.tag_model.create({"name": "Tag", "category_id": category.id})
+        file_model = self.file_model.with_context(
+            default_category_id=category.id, default_tag_ids=[(6, 0, tag.ids)]
+        )
+        result = file_model._create_from_uploads(
+            self.directory2, [("upload.txt", b"upload")]
+        )
+        record = self.file_model.browse(result[0]["id"])
+        self.assertEqual(record.category_id, category, "Defaults should apply")
+        self.assertEqual(record.tag_ids, tag, "Defaults should apply")
+
+    @users("dms-manager", "dms-user")
+    def test_create_from_uploads_errors(self):
+        result = self.file_model._create_from_uploads(
+            self.directory2, [("up/load.txt", b"upload"), ("upload2.txt", b"upload")]
+        )
+        self.assertTrue(result[0].get("error"), "Invalid name should be reported")
+        self.assertTrue(result[1].get("id"), "Other files should still be created")
+
+    @users("dms-manager", "dms-user")
+    def test_create_from_uploads_names(self):
+        self.create_file(directory=self.directory2).name = "upload.txt"
+        result = self.file_model._create_from_uploads(
+            self.directory2, [("upload.txt", b"upload"), ("upload.txt", b"upload")]
+        )
+        self.assertEqual(
+            [item["name"] for item in result],
+            ["upload(1).txt", "upload(2).txt"],
+            msg="Duplicated names should get a suffix",
+        )
+
     @users("dms-manager", "dms-user")
     def test_lock_file(self):
         file = self.create_file(directory=self.directory)
@@ -55,6 +103,18 @@ class FileDatabaseTestCase(StorageDatabaseBaseCase):
         file.write({"name": "test-%s.jpg" % self.env.user.login})
         self.assertNotEqual(file.extension, extension, "Extension should be different")
 
+    @mute_logger("odoo.sql_db")
+    def test_check_name(self):
+        file = self.create_file(directory=self.directory)
+        with self.assertRaises(ValidationError, msg="Name should be invalid"):
+            file.name = "test/file.txt"
+        file.name = "CON.txt"
+        self.env["ir.config_parameter"].set_param("dms.name_rules", "posix,windows")
+        with self.assertRaises(ValidationError, msg="Name is reserved on Windows"):
+            file.name = "NUL.txt"
+        with self.assertRaises(ValidationError, msg="Name should be too long"):
+            file.name = "é" * 128
+
     @users("dms-manager", "dms-user")
     def test_move_file(self):
         file = self.create_file(directory=self.directory)
@@ -86,8 +146,48 @@ class FileDatabaseTestCase(StorageDatabaseBaseCase):
 
     @users("dms-manager", "dms-user")
     def test_compute_thumbnail(self):
+        self.file_model._cron_generate_thumbnails()
+        self.assertFalse(self.file_demo_01.thumbnail_pending)
         self.assertTrue(self.file_demo_01.image_128, "Thumbnail should be computed")
 
+    def test_thumbnail_queue(self):
+        file = self.create_file(directory=self.directory, content=self.image_base64())
+        self.assertTrue(file.thumbnail_pending, "Thumbnail should be queued")
+        self.assertFalse(file.image_128)
+        self.assertIn("/dms/static/icons/", file.icon_url)
+        self.env["ir.config_parameter"].set_param("dms.thumbnail_max_pixels", 1)
+        self.file_model._cron_generate_thumbnails()
+        self.assertFalse(file.thumbnail_pending)
+        self.assertFalse(file.image_128, "Image should be too large to be decoded")
+        file.content = self.image_base64(size=(32, 32))
+        self.env["ir.config_parameter"].set_param("dms.thumbnail_max_pixels", 0)
+        self.file_model._cron_generate_thumbnails()
+        self.assertTrue(file.image_128, "Thumbnail should be generated")
+        self.assertIn("/web/image/", file.icon_url)
+        other_file = self.create_file(
+            directory=self.directory, content=self.image_base64(size=(32, 32))
+        )
+        self.file_model._cron_generate_thumbnails()
+        self.assertEqual(
+            other_file.image_1920,
+            file.image_1920,
+            "Thumbnail should be shared by files with the same checksum",
+        )
+
+    def test_thumbnail_workers(self):
+        files = self.create_file(
+            directory=self.directory, content=self.image_base64(size=(24, 24))
+        ) | self.create_file(
+            directory=self.directory, content=self.image_base64(size=(48, 48))
+        )
+        self.env["ir.config_parameter"].set_param("dms.thumbnail_workers", 2)
+        self.file_model._cron_generate_thumbnails()
+        for record in files:
+            self.assertFalse(record.thumbnail_pending)
+            self.assertTrue(
+                record.image_128, "Thumbnail should be generated by the workers"
+            )
+
     @users("dms-manager", "dms-user")
     def test_compute_path_names(self):
         self.assertTrue(self.file.path_names, "Path names should be computed")
@@ -100,6 +200,30 @@ class FileDatabaseTestCase(StorageDatabaseBaseCase):
     def test_compute_mimetype(self):
         self.assertTrue(self.file.mimetype, "Mimetype should be computed")
 
+    @users("dms-manager", "dms-user")
+    def test_compute_mimetype_header(self):
+        with io.BytesIO() as stream:
+            with zipfile.ZipFile(stream, "w") as archive:
+                archive.writestr("word/document.xml", "x" * 10000)
+            content = base64.b64encode(stream.getvalue())
+        file = self.create_file(directory=self.directory, content=content)
+        file.name = "document.docx"
+        self.assertEqual(
+            file.mimetype,
+            "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+            "Zip based formats should be recognized by their name",
+        )
+        self.assertEqual(file.extension, "docx")
+        image_file = self.create_file(
+            directory=self.directory, content=self.image_base64()
+        )
+        self.assertEqual(image_file.mimetype, "image/png")
+        self.file_model._cron_generate_thumbnails()
+        image_file.content = self.image_base64()
+        self.assertFalse(
+            image_file.thumbnail_pending, "Unchanged content should not be processed"
+        )
+
     @users("dms-manager", "dms-user")
     def test_compute_extension(self):
         self.assertTrue(self.file.extension, "Extension should be computed")
@@ -152,3 +276,25 @@ class FileDatabaseTestCase(StorageDatabaseBaseCase):
         )
         res = self.file.search_panel_select_range("directory_id", enable_counters=True)
         self.assertTrue(self.directory2.id == x["id"] for x in res["values"])
+
+    @users("dms-manager", "dms-user")
+    def test_search_panel_tag_counts(self):
+        category = self.category_model.create({"name": "Category"})
+        tag = self.tag_model.create({"name": "Tag", "category_id": category.id})
+        self.file.tag_ids = tag
+        file_model = self.env["dms.file"]
+
+        def count(**kwargs):
+            values = file_model.search_panel_select_multi_range("tag_ids", **kwargs)
+            return next(value["count"] for value in values if value["id"] == tag.id)
+
+        domain = [("directory_id", "=", self.directory.id)]
+        self.assertEqual(count(search_domain=domain), 1)
+        self.assertEqual(
+            count(search_domain=domain + [("name", "=", "unknown")]),
+            0,
+            "The counts should respect the search",
+        )
+        self.assertEqual(
+            count(category_domain=[("directory_id", "=", self.directory2.id)]), 0
+        )
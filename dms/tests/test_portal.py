@@ -45,6 +45,60 @@ class TestDmsPortal(odoo.tests.HttpCase, StorageAttachmentBaseCase):
             response.status_code, 200, "Can access directory with correct access_token"
         )
 
+    def test_directory_items_portal(self):
+        self.authenticate("portal", "portal")
+        for _index in range(2):
+            self.create_file(directory=self.directory_partner)
+        self.directory_partner._portal_ensure_token()
+        url = "/my/dms/directory/%s/items" % self.directory_partner.id
+        params = {"access_token": self.directory_partner.access_token, "limit": 2}
+        first_page = self.make_jsonrpc_request(url, params)
+        second_page = self.make_jsonrpc_request(url, dict(params, offset=2))
+        files = self.directory_partner.file_ids
+        self.assertEqual(first_page["total"], len(files))
+        self.assertEqual(len(first_page["files"]), 2, "Only a page should be sent")
+        self.assertEqual(
+            {item["id"] for item in first_page["files"] + second_page["files"]},
+            set(files.ids),
+            "Pages should cover all the files",
+        )
+        self.assertEqual(
+            set(first_page["files"][0]),
+            {"id", "name", "icon_url", "human_size", "write_date"},
+        )
+        page = self.make_jsonrpc_request(url, dict(params, offset=-5, limit=-1))
+        self.assertEqual(
+            len(page["files"]), len(files), "Negative values should be clamped"
+        )
+        page = self.make_jsonrpc_request(url, dict(params, offset="abc"))
+        self.assertIn("error", page, "Offset should be an integer")
+        params["access_token"] = "abc-def"
+        self.assertIn("error", self.make_jsonrpc_request(url, params))
+
+    def test_download_portal(self):
+        self.authenticate("portal", "portal")
+        url = self.file_partner._get_share_url()
+        response = self.url_open(url, timeout=20)
+        self.assertEqual(response.status_code, 200, "Can download file")
+        self.assertEqual(response.content, b"\xff data", "Content is streamed as is")
+        checksum = (
+            self.file_partner.checksum or self.file_partner.attachment_id.checksum
+        )
+        self.assertEqual(
+            response.headers.get("ETag"),
+            '"%s"' % checksum,
+            "The checksum is used as ETag",
+        )
+        # 304: Content not modified
+        response = self.url_open(
+            url, timeout=20, headers={"If-None-Match": response.headers["ETag"]}
+        )
+        self.assertEqual(response.status_code, 304, "Content should not be resent")
+        # 206: Partial content
+        response = self.url_open(url, timeout=20, headers={"Range": "bytes=1-"})
+        self.assertEqual(response.status_code, 206, "Range should be supported")
+        self.assertEqual(response.content, b" data", "Only the range is sent")
+
     def test_tour(self):
         for tour in ("dms_portal_mail_tour", "dms_portal_partners_tour"):
             with self.subTest(tour=tour):
@@ -3,6 +3,8 @@
 # Copyright 2022 Víctor Martínez
 # License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl).
 
+import base64
+
 from odoo.tests.common import users
 from odoo.tools import mute_logger
 
@@ -136,3 +138,77 @@ class StorageDatabaseTestCase(StorageDatabaseBaseCase):
         self.assertEqual(
             file_03.save_type, "database", "File savetype should be database"
         )
+
+    @users("dms-manager")
+    def test_update_file_migration(self):
+        files = self.create_file(directory=self.directory) | self.file
+        self.storage.write({"save_type": "file"})
+        for record in files:
+            self.assertTrue(record.require_migration, "File should require migration")
+            self.assertEqual(record.migration, "Database > Filestore")
+        self.storage.write({"save_type": "attachment"})
+        self.assertFalse(any(files.mapped("require_migration")))
+        self.assertEqual(files.mapped("migration"), ["Attachment"] * 2)
+        self.storage.write({"save_type": "database"})
+        self.assertFalse(any(files.mapped("require_migration")))
+        self.assertEqual(files.mapped("migration"), ["Database"] * 2)
+
+    @users("dms-manager")
+    @mute_logger("odoo.models.unlink")
+    def test_migrate_files(self):
+        file_01 = self.create_file(directory=self.directory)
+        file_02 = self.create_file(directory=self.directory)
+        self.storage.write({"save_type": "file"})
+        self.assertTrue(file_01.require_migration, "File should require migration")
+        id_ranges = self.storage._get_migration_id_ranges(2)
+        self.assertEqual(len(id_ranges), 2, "Files should be split in 2 ranges")
+        for id_from, id_to in id_ranges:
+            self.storage._migrate_files(batch_size=1, id_from=id_from, id_to=id_to)
+        for record in file_01 | file_02:
+            self.assertEqual(record.save_type, "file", "File should be migrated")
+            self.assertFalse(record.require_migration)
+            self.assertEqual(
+                record.content, self.content_base64(), "Content should be kept"
+            )
+        self.storage.write({"save_type": "database", "deduplicate_content": True})
+        self.assertTrue(self.storage._migrate_files(), "Files should be migrated back")
+        self.assertEqual(file_01.save_type, "database")
+        self.assertEqual(file_01.blob_id, file_02.blob_id, "Blob should be shared")
+        self.assertEqual(file_02.content, self.content_base64())
+
+    @users("dms-manager")
+    def test_content_blob(self):
+        file_01 = self.create_file(directory=self.directory)
+        file_02 = self.create_file(directory=self.directory)
+        self.assertTrue(file_01.blob_id, "Content should be stored in a blob")
+        self.assertFalse(file_01.blob_id.shared, "Blob should belong to the file")
+        self.assertNotEqual(file_01.blob_id, file_02.blob_id)
+        binary = base64.b64decode(self.content_base64())
+        self.assertEqual(file_01.sudo().blob_id._read(), binary)
+        self.assertEqual(file_01.sudo().blob_id._read(1, 4), binary[1:5])
+        self.assertEqual(file_01.save_type, "database")
+        self.assertEqual(file_01.content, self.content_base64())
+
+    @users("dms-manager")
+    @mute_logger("odoo.models.unlink")
+    def test_deduplicate_content(self):
+        self.storage.write({"deduplicate_content": True})
+        file_01 = self.create_file(directory=self.directory)
+        file_02 = self.create_file(directory=self.directory)
+        blob = file_01.blob_id
+        self.assertTrue(blob, "Content should be stored in a blob")
+        self.assertTrue(blob.shared, "Blob should be shared per checksum")
+        self.assertEqual(file_02.blob_id, blob, "Blob should be shared")
+        self.assertEqual(blob.ref_count, 2, "Blob should have 2 references")
+        self.assertEqual(
+            file_01.content, self.content_base64(), "Content should be readable"
+        )
+        self.assertEqual(
+            self.storage.deduplication_ratio,
+            1.5,
+            "Three files should be stored in two copies",
+        )
+        file_01.unlink()
+        self.assertTrue(blob.exists(), "Blob should be kept while referenced")
+        file_02.unlink()
+        self.assertFalse(blob.exists(), "Blob should be garbage collected")
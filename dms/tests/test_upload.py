@@ -0,0 +1,44 @@
+# Copyright 2024 Subteno - Timothée Vannier (https://www.subteno.com).
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl).
+
+import json
+
+import odoo.tests
+from odoo import http
+
+from .common import StorageDatabaseBaseCase
+
+
+@odoo.tests.tagged("post_install", "-at_install")
+class TestDmsFileUpload(odoo.tests.HttpCase, StorageDatabaseBaseCase):
+    def test_upload(self):
+        category = self.category_model.create({"name": "Category"})
+        tag = self.tag_model.create({"name": "Tag", "category_id": category.id})
+        context = {
+            "default_category_id": category.id,
+            "default_tag_ids": [(6, 0, tag.ids)],
+        }
+        self.authenticate("dms-user", "dms-user")
+        response = self.url_open(
+            "/dms/file/upload",
+            data={
+                "csrf_token": http.Request.csrf_token(self),
+                "directory_id": self.directory.id,
+                "context": json.dumps(context),
+            },
+            files=[
+                ("ufile", ("upload.txt", b"upload", "text/plain")),
+                ("ufile", ("upload2.txt", b"upload", "text/plain")),
+            ],
+            timeout=20,
+        )
+        self.assertEqual(response.status_code, 200)
+        files = self.file_model.browse([item["id"] for item in response.json()])
+        self.assertEqual(
+            files.mapped("name"),
+            ["upload.txt", "upload2.txt"],
+            msg="Every uploaded file should be created",
+        )
+        self.assertEqual(files.directory_id, self.directory)
+        self.assertEqual(files.category_id, category, "Defaults should apply")
+        self.assertEqual(files.tag_ids, tag, "Defaults should apply")
@@ -3,30 +3,66 @@
 # Copyright 2024 Subteno - Timothée Vannier (https://www.subteno.com).
 # License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl).
 
+import functools
 import mimetypes
 import os
 import re
-import shutil
-import tempfile
 
 from odoo.tools.mimetypes import guess_mimetype
 
-
-def check_name(name):
+# Number of bytes of the contents used to guess their type
+HEADER_SIZE = 4096
+
+# Naming rules of the target filesystems, names are checked against all the
+# rule sets configured in the ``dms.name_rules`` system parameter.
+NAME_RULES = {
+    "posix": {
+        "forbidden_chars": frozenset("/\0"),
+        "reserved_names": frozenset({".", ".."}),
+        "reserved_stems": frozenset(),
+        "forbidden_endings": "",
+        "encoding": "utf-8",
+        "max_bytes": 255,
+    },
+    "windows": {
+        "forbidden_chars": frozenset('<>:"/\\|?*' + "".join(map(chr, range(32)))),
+        "reserved_names": frozenset({".", ".."}),
+        "reserved_stems": frozenset(
+            {"CON", "PRN", "AUX", "NUL"}
+            | {f"COM{index}" for index in range(1, 10)}
+            | {f"LPT{index}" for index in range(1, 10)}
+        ),
+        "forbidden_endings": " .",
+        "encoding": "utf-16-le",
+        "max_bytes": 510,
+    },
+}
+
+
+@functools.lru_cache(maxsize=16384)
+def check_name(name, rules=("posix",)):
     """
     Check if a file name is valid.
 
+    The name is checked in memory against the rules of the target filesystems,
+    see ``NAME_RULES``.
+
     :param str name: The file name to check.
+    :param tuple rules: The names of the rule sets to check the name against.
     :return: True if the file name is valid, False otherwise.
     :rtype: bool
     """
-    tmp_dir = tempfile.mkdtemp()
-    try:
-        open(os.path.join(tmp_dir, name), "a").close()
-    except OSError:
+    if not name:
         return False
-    finally:
-        shutil.rmtree(tmp_dir)
+    for rule in map(NAME_RULES.get, rules):
+        if (
+            name in rule["reserved_names"]
+            or name.split(".")[0].rstrip().upper() in rule["reserved_stems"]
+            or name[-1] in rule["forbidden_endings"]
+            or not rule["forbidden_chars"].isdisjoint(name)
+            or len(name.encode(rule["encoding"], "surrogatepass")) > rule["max_bytes"]
+        ):
+            return False
     return True
 
 
@@ -48,6 +84,63 @@ def compute_name(name, suffix, escape_suffix):
     return f"{name}({suffix})"
 
 
+class NameAllocator:
+    """
+    Allocate unique names among the names of sibling files or directories.
+
+    The existing names are indexed once, in a set and in the highest suffix in
+    use per name without suffix, so that each allocation takes constant time
+    however many names share the same stem.
+
+    :param iterable names: The existing names.
+    :param bool escape_suffix: If True, the suffix is added in between the name
+    and the file extension.
+    """
+
+    # e.g: "file(1).txt" -> "1"
+    #      "Directory (1)(2)" -> "2"
+    _digits = re.compile(r"\((\d+)\)(\.\w+)?$")
+
+    def __init__(self, names, escape_suffix=False):
+        self.names = set()
+        self.suffixes = {}
+        self.escape_suffix = escape_suffix
+        for name in names:
+            self._add(name)
+
+    def _split(self, name):
+        """Split a name in the name without suffix and the suffix."""
+        match = self._digits.search(name)
+        if not match:
+            return name, 0
+        return name[: match.span()[0]] + (match.group(2) or ""), int(match.group(1))
+
+    def _add(self, name):
+        self.names.add(name)
+        stem, suffix = self._split(name)
+        if suffix > self.suffixes.get(stem, 0):
+            self.suffixes[stem] = suffix
+
+    def allocate(self, name):
+        """
+        Get a unique name for a new file or directory and reserve it.
+
+        :param str name: The wanted name.
+        :return: The name itself if it is free, else the name with the next
+        free suffix.
+        :rtype: str
+        """
+        if name in self.names:
+            stem = self._split(name)[0]
+            suffix = self.suffixes.get(stem, 0) + 1
+            name = compute_name(stem, suffix, self.escape_suffix)
+            while name in self.names:
+                suffix += 1
+                name = compute_name(stem, suffix, self.escape_suffix)
+        self._add(name)
+        return name
+
+
 def unique_name(name, names, escape_suffix=False):
     """
     Generate a unique name by adding a suffix to the original name.
@@ -59,28 +152,31 @@ def unique_name(name, names, escape_suffix=False):
     :return: The unique name.
     :rtype: str
     """
-    if name not in names:
-        return name
+    return NameAllocator(names, escape_suffix).allocate(name)
 
-    # Extract the suffix from the name
-    # e.g: "file(1).txt" -> "1"
-    #      "Directory (1)(2)" -> "2"
-    digits = re.compile(r"\((\d+)\)(\.\w+)?$")
-    match = digits.search(name)
-    suffix = 1
-    if match:
-        suffix = int(match.group(1)) + 1
-        # get the name without the suffix and append the extension
-        name = name[: match.span()[0]] + (match.group(2) or "")
-
-    name = compute_name(name, suffix, escape_suffix)
-    while name in names:
-        # has to check recursively if the new name is unique because the user can
-        # rename the file with suffix n+1
-        # and then duplicate the file n, leading to a new file with suffix n+1 which
-        # is already used.
-        return unique_name(name, names, escape_suffix)
-    return name
+
+def guess_file_type(name, header):
+    """
+    Guess the mimetype and the extension of a file from the first bytes of its
+    content.
+
+    Zip based formats, such as office documents, can't be told apart from the
+    header only and are recognized by the name of the file.
+
+    :param str name: The name of the file.
+    :param bytes header: The first ``HEADER_SIZE`` bytes of the content, any
+    bytes after them are ignored.
+    :return: A tuple with the mimetype and the extension of the file.
+    :rtype: tuple
+    """
+    header = header[:HEADER_SIZE]
+    if header.startswith(b"PK\x03\x04"):
+        mimetype = "application/zip"
+    else:
+        mimetype = guess_mimetype(header)
+    if mimetype in ("application/zip", "application/octet-stream") and name:
+        mimetype = mimetypes.guess_type(name)[0] or mimetype
+    return mimetype, guess_extension(name, mimetype)
 
 
 def guess_extension(filename=None, mimetype=None, binary=None):
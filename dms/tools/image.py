@@ -0,0 +1,220 @@
+# Copyright 2024 Subteno - Timothée Vannier (https://www.subteno.com).
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl).
+
+import base64
+import functools
+import io
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from odoo.exceptions import UserError
+from odoo.tools.image import image_process
+from odoo.tools.misc import find_in_path
+
+# Seconds allowed to the external programs to render a document
+RENDER_TIMEOUT = 60
+
+# Run by the worker processes, see ``thumbnail_worker``
+WORKER_PATH = os.path.join(os.path.dirname(__file__), "thumbnail_worker.py")
+
+
+def generate_thumbnail(binary, max_pixels=0):
+    """
+    Generate the thumbnail of an image.
+
+    This function does not use the environment, so that it can run in a worker
+    process.
+
+    :param bytes binary: The raw content of the image.
+    :param int max_pixels: The maximum number of pixels of the images to decode,
+    read from their header. 0 means no limit.
+    :return: The base64 encoded thumbnail, False if it can't be generated.
+    :rtype: bytes
+    """
+    if binary[:1] == b"<":
+        # SVG images are used as is
+        return base64.b64encode(binary)
+    try:
+        with Image.open(io.BytesIO(binary)) as image:
+            width, height = image.size
+        if max_pixels and width * height > max_pixels:
+            return False
+        return base64.b64encode(
+            image_process(binary, size=(1920, 1920), verify_resolution=False)
+        )
+    except (OSError, ValueError, Image.DecompressionBombError, UserError):
+        return False
+
+
+# Office documents rendered by LibreOffice
+OFFICE_MIMETYPES = (
+    "application/msword",
+    "application/rtf",
+    "application/vnd.ms-excel",
+    "application/vnd.ms-powerpoint",
+    "application/vnd.oasis.opendocument.presentation",
+    "application/vnd.oasis.opendocument.spreadsheet",
+    "application/vnd.oasis.opendocument.text",
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+)
+
+
+@functools.lru_cache
+def find_program(*names):
+    """
+    Find the first of the given programs available on the system.
+
+    :return: The path to the program, None if none of them is available.
+    :rtype: str
+    """
+    for name in names:
+        try:
+            return find_in_path(name)
+        except OSError:
+            continue
+    return None
+
+
+def render_pdf(binary, max_pixels=0):
+    """
+    Generate the thumbnail of the first page of a PDF document with pdftoppm.
+
+    :param bytes binary: The raw content of the document.
+    :param int max_pixels: See ``generate_thumbnail``.
+    :return: The base64 encoded thumbnail, False if it can't be generated.
+    :rtype: bytes
+    """
+    pdftoppm = find_program("pdftoppm")
+    if not pdftoppm:
+        return False
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "source.pdf")
+        with open(source, "wb") as file:
+            file.write(binary)
+        try:
+            subprocess.run(
+                [pdftoppm, "-f", "1", "-l", "1", "-singlefile", "-png"]
+                + ["-scale-to", "1920", source, os.path.join(directory, "page")],
+                check=True,
+                capture_output=True,
+                timeout=RENDER_TIMEOUT,
+            )
+            with open(os.path.join(directory, "page.png"), "rb") as file:
+                return generate_thumbnail(file.read(), max_pixels)
+        except (OSError, subprocess.SubprocessError):
+            return False
+
+
+def render_office(binary, max_pixels=0):
+    """
+    Generate the thumbnail of the first page of an office document, converted
+    to PDF by LibreOffice.
+
+    :param bytes binary: The raw content of the document.
+    :param int max_pixels: See ``generate_thumbnail``.
+    :return: The base64 encoded thumbnail, False if it can't be generated.
+    :rtype: bytes
+    """
+    soffice = find_program("soffice", "libreoffice")
+    if not soffice:
+        return False
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "source")
+        with open(source, "wb") as file:
+            file.write(binary)
+        try:
+            subprocess.run(
+                [
+                    soffice,
+                    # A profile per conversion, as a profile can't be shared
+                    # by concurrent processes
+                    "-env:UserInstallation=file://%s" % directory,
+                    "--headless",
+                    "--convert-to",
+                    "pdf",
+                    "--outdir",
+                    directory,
+                    source,
+                ],
+                check=True,
+                capture_output=True,
+                timeout=RENDER_TIMEOUT,
+            )
+            with open(os.path.join(directory, "source.pdf"), "rb") as file:
+                return render_pdf(file.read(), max_pixels)
+        except (OSError, subprocess.SubprocessError):
+            return False
+
+
+def render_in_process(tasks, max_pixels=0):
+    """
+    Render thumbnails in a new Python process.
+
+    The process is started from scratch instead of being forked from the Odoo
+    worker, which would copy its database connections, locks and threads. It
+    runs ``thumbnail_worker``, which does not import the addon.
+
+    :param list tasks: The ``(renderer, binary)`` pairs to render, the
+    renderers must be functions of this module.
+    :param int max_pixels: See ``generate_thumbnail``.
+    :return: The thumbnails of the tasks, False for the ones that failed.
+    :rtype: list
+    """
+    payload = pickle.dumps(
+        ([(renderer.__name__, binary) for renderer, binary in tasks], max_pixels)
+    )
+    try:
+        process = subprocess.run(
+            [sys.executable, WORKER_PATH],
+            input=payload,
+            check=True,
+            capture_output=True,
+            timeout=RENDER_TIMEOUT * (len(tasks) + 1),
+            env=dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, sys.path))),
+        )
+        return pickle.loads(process.stdout)
+    except (OSError, EOFError, subprocess.SubprocessError, pickle.UnpicklingError):
+        return [False] * len(tasks)
+
+
+def render_in_processes(tasks, max_pixels=0, workers=2):
+    """
+    Render thumbnails in parallel in several new Python processes.
+
+    The renderers that are not functions of this module, like the ones added
+    by other modules, are called in the current process.
+
+    :param list tasks: The ``(renderer, binary)`` pairs to render.
+    :param int max_pixels: See ``generate_thumbnail``.
+    :param int workers: The number of processes.
+    :return: The thumbnails of the tasks, in the same order.
+    :rtype: list
+    """
+    results = [False] * len(tasks)
+    indexes = []
+    for index, (renderer, binary) in enumerate(tasks):
+        if globals().get(renderer.__name__) is renderer:
+            indexes.append(index)
+        else:
+            results[index] = renderer(binary, max_pixels)
+    chunks = [indexes[index::workers] for index in range(workers)]
+    chunks = [chunk for chunk in chunks if chunk]
+    if not chunks:
+        return results
+
+    def render(chunk):
+        return render_in_process([tasks[index] for index in chunk], max_pixels)
+
+    with ThreadPoolExecutor(len(chunks)) as executor:
+        for chunk, thumbnails in zip(chunks, executor.map(render, chunks), strict=True):
+            for index, thumbnail in zip(chunk, thumbnails, strict=True):
+                results[index] = thumbnail
+    return results
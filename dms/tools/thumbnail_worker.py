@@ -0,0 +1,25 @@
+# Copyright 2024 Subteno - Timothée Vannier (https://www.subteno.com).
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl).
+"""
+Render thumbnails in a process started by ``image.render_in_process``.
+
+This module is run as a script and does not import the addon: the renderers
+are looked up by name in the ``image`` module next to it, which only depends
+on Pillow and the Odoo tools. The tasks are read pickled from stdin and the
+thumbnails are written pickled to stdout.
+"""
+
+import pickle
+import sys
+
+import image
+
+
+def main():
+    tasks, max_pixels = pickle.load(sys.stdin.buffer)
+    results = [getattr(image, name)(binary, max_pixels) for name, binary in tasks]
+    sys.stdout.buffer.write(pickle.dumps(results))
+
+
+if __name__ == "__main__":
+    main()